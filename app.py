@@ -1,9 +1,17 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
-import subprocess
 import time
+from etfcore.storage import csv_path
+from etfcore.pipeline import load_snapshots
+from etfcore.cache import FrameCache
+from jobs import UpdateManager
+from etfcore.diffs import get_diff, ensure_diffs
+from etfcore.funds import FUNDS, fund_codes
+from etfcore.consensus import MATRIX_PATH, HoldingsMatrix, ensure_matrix
+from etfcore.prices import PRICE_PATH, PriceMatrix, load_prices, add_flows, has_flows
+from etfcore import tracing
+from etfcore.tracing import span
 
 st.set_page_config(page_title="ETF 經理人戰情室", layout="wide", page_icon="🦁")
 
@@ -17,83 +25,70 @@ st.markdown("""
 
 st.title("🦁 主動式 ETF 經理人操盤戰情室")
 
+# 側邊欄底部的「效能面板」打開時，這個 session 的每次重跑都記錄下來 (etfcore/tracing.py)；
+# 開關只作用在這個 session 的 context，不影響其他人。用 ETF_TRACE 啟動時整個行程都記錄。
+tracing.set_session(st.session_state.get("perf_panel", False))
+render = tracing.trace("render", app="app").start()
+
+# 整個 Streamlit 行程共用一份快取 (所有 session、所有 rerun)
+@st.cache_resource
+def get_frame_cache():
+    return FrameCache()
+
 # --- 側邊欄：手動更新功能 ---
+@st.cache_resource
+def get_update_manager():
+    return UpdateManager()
+
+def update_panel():
+    manager = get_update_manager()
+    job = manager.current()
+    if job is None: return
+    if "update_seen" not in st.session_state and not job.running:
+        st.session_state["update_seen"] = job.id  # 新開的頁面：之前跑完的更新不用再重載
+    # 有更新在跑才定時刷新這一小塊；跑完觸發整頁重跑載入新資料
+    @st.fragment(run_every=1.0 if job.running else None)
+    def progress():
+        if job.running:
+            st.info(f"⏳ 背景更新中 ({time.time() - job.started:.0f} 秒)...")
+            for code, status in sorted(job.funds.items()): st.caption(f"**{code}** {status}")
+            return
+        if st.session_state.get("update_seen") != job.id:
+            st.session_state["update_seen"] = job.id
+            get_frame_cache().invalidate()
+            st.rerun()
+        if job.ok: st.success(f"✅ 更新完成 ({job.finished - job.started:.0f} 秒)")
+        else: st.error("❌ 更新失敗")
+        with st.expander("爬蟲 Log"): st.code("\n".join(job.lines[-100:]))
+    progress()
+
 with st.sidebar:
     st.header("⚙️ 系統功能")
     if st.button("🔄 立即手動更新資料"):
-        status_text = st.empty()
-        status_text.info("⏳ 正在連線爬蟲，請稍候 (約需 1-2 分鐘)...")
-        try:
-            # 執行 python update_data.py
-            result = subprocess.run(["python", "update_data.py"], capture_output=True, text=True)
-            if result.returncode == 0:
-                status_text.success("✅ 更新成功！請重新整理網頁。")
-                st.code(result.stdout) # 顯示爬蟲 Log 讓你知道發生什麼事
-                time.sleep(3)
-                st.rerun() # 自動重整
-            else:
-                status_text.error("❌ 更新失敗")
-                st.error(result.stderr)
-        except Exception as e:
-            status_text.error(f"❌ 執行錯誤: {e}")
+        # 不會卡住畫面；已經有人在更新就直接加入那一次
+        get_update_manager().start(env=tracing.subprocess_env())  # 面板打開時，這次更新也記錄
+    update_panel()
     st.markdown("---")
 
 # --- 讀取資料 ---
 def load_data(etf_code):
-    file_path = f"data/{etf_code}_history.csv"
-    if os.path.exists(file_path):
-        df = pd.read_csv(file_path)
-        df['Date'] = pd.to_datetime(df['Date'])
-        # 清洗
-        df['權重'] = df['權重'].astype(str).str.replace('%', '')
-        df['權重'] = pd.to_numeric(df['權重'], errors='coerce').fillna(0)
-        df['持有股數'] = df['持有股數'].astype(str).str.replace(',', '').str.replace('--', '0')
-        df['持有股數'] = pd.to_numeric(df['持有股數'], errors='coerce').fillna(0)
-        
-        df = df[~df['股票名稱'].str.contains('查看更多|更多|Total', na=False)]
-        
-        return df.sort_values(by='Date', ascending=False)
-    return None
-
-# --- 計算異動 ---
-def get_comparison(df, current_date, base_date):
-    df_curr = df[df['Date'] == current_date].copy()
-    df_base = df[df['Date'] == base_date].copy()
-    
-    merged = pd.merge(
-        df_curr[['股票代號', '股票名稱', '持有股數', '權重']],
-        df_base[['股票代號', '持有股數', '權重']],
-        on='股票代號', how='outer', suffixes=('_今', '_昨')
-    )
-    merged = merged.fillna(0)
-    
-    merged['股數增減'] = merged['持有股數_今'] - merged['持有股數_昨']
-    merged['權重增減'] = merged['權重_今'] - merged['權重_昨']
-    
-    def determine_status(row):
-        if row['持有股數_昨'] == 0 and row['持有股數_今'] > 0: return '✨ 新進'
-        if row['持有股數_昨'] > 0 and row['持有股數_今'] == 0: return '❌ 剔除'
-        if row['股數增減'] > 0: return '🔴 加碼'
-        if row['股數增減'] < 0: return '🟢 減碼'
-        return '⚪ 持平'
-
-    merged['狀態'] = merged.apply(determine_status, axis=1)
-    
-    for idx, row in merged.iterrows():
-        if row['股票名稱'] == 0:
-            old_name = df_base[df_base['股票代號'] == row['股票代號']]['股票名稱'].values
-            if len(old_name) > 0: merged.at[idx, '股票名稱'] = old_name[0]
-            
-    return merged
+    # 異動表依據對不上 (第一次開、git pull 之後) 先補算，只算過期的日期；沒變只花讀索引的時間
+    ensure_diffs([etf_code])
+    # 以 CSV 的 mtime/size 當版本：資料沒變就直接拿清洗好的結果
+    return get_frame_cache().get(csv_path(etf_code), lambda: load_snapshots(etf_code))
+
+def load_price_matrix():
+    # 收盤價庫 (data/prices.csv) 沒有也沒關係：查不到價格就退回用股數排序
+    return get_frame_cache().get(PRICE_PATH, lambda: PriceMatrix(load_prices()))
 
 # --- 顯示介面 ---
 def show_dashboard(etf_code, etf_name):
-    df = load_data(etf_code)
-    if df is None:
+    snaps = load_data(etf_code)
+    if snaps is None:
         st.error(f"⚠️ {etf_code} 尚未有資料。")
         return
 
-    all_dates = df['Date'].dt.date.unique()
+    all_dates = snaps.dates.date
     if len(all_dates) < 1:
         st.warning("資料不足。")
         return
@@ -104,12 +99,19 @@ def show_dashboard(etf_code, etf_name):
     date_base = st.sidebar.selectbox(f"{etf_code} 比較基準", all_dates, index=default_base_idx)
     st.sidebar.markdown("---")
 
-    merged = get_comparison(df, pd.Timestamp(date_curr), pd.Timestamp(date_base))
-    
+    # 預設的前 1 / 前 5 日比對讀 data/diffs (load_data 補算過)，其他基準日才現場比對
+    merged = get_diff(snaps, etf_code, snaps.position(pd.Timestamp(date_curr)), snaps.position(pd.Timestamp(date_base)))
+    # 估計金額 = 股數增減 × 觀察日收盤價；有價格就依金額排序
+    merged = add_flows(merged, load_price_matrix(), date_curr, {'股數增減': '金額增減'})
+    merged['金額增減'] = merged['金額增減'] / 1e4  # 萬元
+    by_money = has_flows(merged, '金額增減')
+    rank_col = '金額增減' if by_money else '股數增減'
+
     new_entries = merged[merged['狀態'] == '✨ 新進']
     exits = merged[merged['狀態'] == '❌ 剔除']
-    increases = merged[merged['狀態'] == '🔴 加碼'].sort_values('股數增減', ascending=False)
-    decreases = merged[merged['狀態'] == '🟢 減碼'].sort_values('股數增減', ascending=True)
+    increases = merged[merged['狀態'] == '🔴 加碼'].sort_values(rank_col, ascending=False)
+    decreases = merged[merged['狀態'] == '🟢 減碼'].sort_values(rank_col, ascending=True)
+    flow_cols = ['股數增減', '金額增減'] if by_money else ['股數增減']
 
     st.markdown(f"### 🗓️ {date_curr} vs {date_base} 操盤重點")
     
@@ -120,7 +122,7 @@ def show_dashboard(etf_code, etf_name):
         sc1.metric("✨ 新進", f"{len(new_entries)}")
         sc2.metric("🔺 加碼", f"{len(increases)}")
         if not new_entries.empty: st.dataframe(new_entries[['股票名稱', '權重_今', '持有股數_今']], hide_index=True, use_container_width=True)
-        if not increases.empty: st.dataframe(increases.head(5)[['股票名稱', '股數增減', '權重_今']].style.format({'股數增減': '+{:,.0f}'}), hide_index=True, use_container_width=True)
+        if not increases.empty: st.dataframe(increases.head(5)[['股票名稱'] + flow_cols + ['權重_今']].style.format({'股數增減': '+{:,.0f}', '金額增減': '{:+,.0f} 萬'}), hide_index=True, use_container_width=True)
 
     with c2:
         st.success("🟢 **空方操作 (Sell)**")
@@ -128,7 +130,7 @@ def show_dashboard(etf_code, etf_name):
         sc3.metric("❌ 剔除", f"{len(exits)}")
         sc4.metric("🔻 減碼", f"{len(decreases)}")
         if not exits.empty: st.dataframe(exits[['股票名稱', '權重_昨', '持有股數_昨']], hide_index=True, use_container_width=True)
-        if not decreases.empty: st.dataframe(decreases.head(5)[['股票名稱', '股數增減', '權重_今']].style.format({'股數增減': '{:,.0f}'}), hide_index=True, use_container_width=True)
+        if not decreases.empty: st.dataframe(decreases.head(5)[['股票名稱'] + flow_cols + ['權重_今']].style.format({'股數增減': '{:,.0f}', '金額增減': '{:+,.0f} 萬'}), hide_index=True, use_container_width=True)
 
     st.divider()
     
@@ -136,23 +138,100 @@ def show_dashboard(etf_code, etf_name):
     st.subheader("🗺️ 資金流向熱力圖")
     map_data = merged[merged['權重_今'] > 0].copy()
     if not map_data.empty:
-        fig = px.treemap(map_data, path=['股票名稱'], values='權重_今', color='股數增減', color_continuous_scale=['#00aa00', '#ffffff', '#ff0000'], color_continuous_midpoint=0)
-        st.plotly_chart(fig, use_container_width=True)
+        # 顏色 = 估計金額 (萬元)，不同股價的股票才能放在一起比；沒有價格時用股數
+        with span("chart_build", chart="treemap"):
+            fig = px.treemap(map_data, path=['股票名稱'], values='權重_今', color=rank_col, hover_data=flow_cols, color_continuous_scale=['#00aa00', '#ffffff', '#ff0000'], color_continuous_midpoint=0)
+            st.plotly_chart(fig, use_container_width=True)
+        if not by_money: st.caption("ℹ️ 尚無收盤價資料 (`python -m etfcore.prices update` 或 `import`)，暫以股數增減著色")
 
     # 完整列表
     st.subheader("📋 完整持股異動明細 (依權重排序)")
-    show_df = merged[['狀態', '股票代號', '股票名稱', '權重_今', '權重增減', '持有股數_今', '股數增減']].sort_values(by='權重_今', ascending=False)
+    show_df = merged[['狀態', '股票代號', '股票名稱', '權重_今', '權重增減', '持有股數_今'] + flow_cols].sort_values(by='權重_今', ascending=False)
     
     st.dataframe(
         show_df, use_container_width=True, hide_index=True, height=800,
         column_config={
             "狀態": st.column_config.TextColumn("動作", width="small"),
-            "權重_今": st.column_config.ProgressColumn("權重 (%)", format="%.2f%%", min_value=0, max_value=max(show_df['權重_今'].max(), 10)),
-            "股數增減": st.column_config.NumberColumn("持股增減", format="%+d")
+            "權重_今": st.column_config.ProgressColumn("權重 (%)", format="%.2f%%", min_value=0, max_value=max(float(show_df['權重_今'].max()), 10)),
+            "股數增減": st.column_config.NumberColumn("持股增減", format="%+d"),
+            "金額增減": st.column_config.NumberColumn("估計金額 (萬)", format="%+,.0f")
         }
     )
 
-tab1, tab2, tab3 = st.tabs(["00981A 統一", "00991A 復華", "00980A 野村"])
-with tab1: show_dashboard("00981A", "統一台股增長主動式ETF")
-with tab2: show_dashboard("00991A", "復華未來50")
-with tab3: show_dashboard("00980A", "野村臺灣智慧優選")
+# --- 跨基金共識 ---
+def load_consensus():
+    # 每檔基金一次 os.stat；CSV 有變 (git pull、手動更新) 才補算矩陣
+    ensure_matrix(fund_codes())
+    return get_frame_cache().get(MATRIX_PATH, HoldingsMatrix.load)
+
+def show_consensus():
+    matrix = load_consensus()
+    if len(matrix.dates) < 2:
+        st.warning("資料不足。")
+        return
+
+    all_dates = pd.DatetimeIndex(matrix.dates[::-1]).date
+    c1, c2, c3 = st.columns(3)
+    date_curr = c1.selectbox("觀察日期", all_dates, index=0, key="cs_date")
+    n_days = c2.selectbox("比較區間", [1, 5, 20], index=1, format_func=lambda n: f"{n} 個交易日前", key="cs_span")
+    min_funds = c3.selectbox("至少幾家基金", list(range(1, len(matrix.funds) + 1)), index=min(1, len(matrix.funds) - 1), key="cs_min")
+
+    pos = matrix.position(date_curr)
+    base = matrix.back(pos, n_days)
+    table = matrix.consensus(matrix.dates[pos], matrix.dates[base])
+    if table.empty:
+        st.warning("資料不足。")
+        return
+    buys = table[table['加碼家數'] >= min_funds].sort_values(['加碼家數', '合計權重'], ascending=False)
+    sells = table[table['減碼家數'] >= min_funds].sort_values(['減碼家數', '合計權重'], ascending=False)
+    overlap = table[table['持有家數'] >= min_funds].sort_values(['持有家數', '合計權重'], ascending=False)
+
+    st.markdown(f"### 🗓️ {date_curr} vs {pd.Timestamp(matrix.dates[base]).date()} 經理人共識")
+    m1, m2, m3 = st.columns(3)
+    m1.metric("🔴 共同加碼", f"{len(buys)}")
+    m2.metric("🟢 共同減碼", f"{len(sells)}")
+    m3.metric("🤝 共同持有", f"{len(overlap)}")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.info(f"🔴 **{min_funds} 家以上同步加碼**")
+        st.dataframe(buys[['股票名稱', '加碼家數', '新進家數', '加碼基金', '合計權重']], hide_index=True, use_container_width=True)
+    with c2:
+        st.success(f"🟢 **{min_funds} 家以上同步減碼**")
+        st.dataframe(sells[['股票名稱', '減碼家數', '剔除家數', '減碼基金', '合計權重']], hide_index=True, use_container_width=True)
+
+    st.subheader("🤝 持股重疊 (各基金權重 %)")
+    fund_cols = [c for c in matrix.funds if c in overlap.columns]
+    st.dataframe(overlap[['股票代號', '股票名稱', '持有家數'] + fund_cols + ['合計權重']], hide_index=True, use_container_width=True, height=600)
+
+# 分頁依 etfcore/funds.py 登錄表產生，最後一頁是跨基金共識
+tabs = st.tabs([f"{f['code']} {f['label']}" for f in FUNDS] + ["🤝 跨基金共識"])
+for tab, fund in zip(tabs, FUNDS):
+    with tab, span("render_fund", fund=fund["code"]): show_dashboard(fund["code"], fund["name"])
+with tabs[-1], span("render_fund", fund="共識"): show_consensus()
+
+# --- 效能面板 ---
+def breakdown_frame(spans):
+    """span → 一列一檔基金、一欄一個步驟 (毫秒)，依總耗時排序"""
+    table = pd.DataFrame.from_dict(tracing.breakdown(spans), orient="index").fillna(0.0)
+    if table.empty: return table
+    table = table[table.sum().sort_values(ascending=False).index].round(1)
+    return table.rename_axis("基金")
+
+def perf_panel():
+    st.caption(f"本次畫面 (ms，目前共 {render.elapsed_ms():,.0f} ms；快取命中的步驟不會出現)")
+    st.dataframe(breakdown_frame(tracing.trace_spans(render.trace)), use_container_width=True)
+    root, spans = tracing.last_trace(tracing.read_spans(), "update")
+    if root is None:
+        st.caption("尚無更新紀錄：面板打開時按「立即手動更新」就會記錄")
+        return
+    when = time.strftime('%m-%d %H:%M', time.localtime(root['ts']))
+    st.caption(f"最近一次更新 ({when}，共 {root['ms'] / 1000:,.1f} 秒)")
+    st.dataframe(breakdown_frame(spans), use_container_width=True)
+
+with st.sidebar:
+    stats = get_frame_cache().stats()
+    st.caption(f"🗄️ 資料快取：命中 {stats['hits']} / 未命中 {stats['misses']} (共 {stats['entries']} 檔，{stats['bytes'] / 1024:,.0f} KB)")
+    st.toggle("⏱️ 效能面板", key="perf_panel", help=f"記錄各步驟耗時到 {tracing.trace_path()}")
+    if render is not tracing.NOOP: perf_panel()
+render.finish()
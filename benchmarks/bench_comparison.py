@@ -0,0 +1,65 @@
+import sys
+import time
+import pandas as pd
+
+from etfcore.comparison import get_comparison
+from etfcore.snapshots import SnapshotIndex
+from benchmarks.synthetic import make_history
+
+# ==========================================
+# get_comparison：舊版 (apply + iterrows) vs 向量化版 vs 向量化 + 快照索引
+#   python -m benchmarks.bench_comparison [持股數] [天數]
+# ==========================================
+def get_comparison_rowwise(df, current_date, base_date):
+    # 原本 app.py 的實作，只留作對照組
+    df_curr = df[df['Date'] == current_date].copy()
+    df_base = df[df['Date'] == base_date].copy()
+    merged = pd.merge(
+        df_curr[['股票代號', '股票名稱', '持有股數', '權重']],
+        df_base[['股票代號', '持有股數', '權重']],
+        on='股票代號', how='outer', suffixes=('_今', '_昨')
+    )
+    merged = merged.fillna(0)
+    merged['股數增減'] = merged['持有股數_今'] - merged['持有股數_昨']
+    merged['權重增減'] = merged['權重_今'] - merged['權重_昨']
+
+    def determine_status(row):
+        if row['持有股數_昨'] == 0 and row['持有股數_今'] > 0: return '✨ 新進'
+        if row['持有股數_昨'] > 0 and row['持有股數_今'] == 0: return '❌ 剔除'
+        if row['股數增減'] > 0: return '🔴 加碼'
+        if row['股數增減'] < 0: return '🟢 減碼'
+        return '⚪ 持平'
+
+    merged['狀態'] = merged.apply(determine_status, axis=1)
+    for idx, row in merged.iterrows():
+        if row['股票名稱'] == 0:
+            old_name = df_base[df_base['股票代號'] == row['股票代號']]['股票名稱'].values
+            if len(old_name) > 0: merged.at[idx, '股票名稱'] = old_name[0]
+    return merged
+
+def best_of(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def main(n_holdings=500, n_days=1000):
+    df = make_history(n_holdings, n_days)
+    dates = df['Date'].drop_duplicates().sort_values(ascending=False).reset_index(drop=True)
+    print(f"📦 合成歷史 {n_holdings} 檔 × {n_days} 天 = {len(df):,} 筆")
+    t_index, snaps = best_of(SnapshotIndex, df, repeat=1)
+    print(f"⏱️ 建立快照索引 (每次載入一次): {t_index * 1000:.1f} ms")
+    for label, base_idx in (("前一日", 1), ("5 日前", 5), ("60 日前", 60)):
+        curr, base = dates[0], dates[min(base_idx, len(dates) - 1)]
+        t_old, old = best_of(get_comparison_rowwise, df, curr, base)
+        t_new, new = best_of(get_comparison, df, curr, base)
+        t_idx, indexed = best_of(get_comparison, snaps, curr, base)
+        pd.testing.assert_frame_equal(old, new, check_dtype=False)
+        pd.testing.assert_frame_equal(old, indexed, check_dtype=False)
+        print(f"⏱️ {label}: 舊版 {t_old * 1000:.1f} ms / 向量化 {t_new * 1000:.1f} ms / 加索引 {t_idx * 1000:.1f} ms"
+              f" (x{t_old / t_idx:.1f})，輸出一致")
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
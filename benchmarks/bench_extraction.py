@@ -0,0 +1,90 @@
+import io
+import sys
+import time
+import pandas as pd
+
+from fetchers import (FIXTURE_DIR, HOLDING_COLUMNS, html_tables, normalize_holdings, parse_holdings_rows,
+                      parse_holdings_tables, serve_fixtures)
+
+# ==========================================
+# 持股表擷取：舊版 (逐列 innerText / pd.read_html) vs 一次拿整頁表格
+#   python -m benchmarks.bench_extraction [次數]
+# 頁面在 fixtures/ (依 data/*.csv 手寫的合成 HTML)；離線部分只比解析，有 Chrome 的話再用真的瀏覽器比 WebDriver round trip
+# ==========================================
+FIXTURES = {"00981A": "00981A_pcf.html", "00991A": "00991A_portfolio.html"}
+
+def parse_read_html(html):
+    # 原本 fetchers.parse_holdings_html 的實作，只留作對照組
+    best = None
+    for df in pd.read_html(io.StringIO(html)):
+        df = normalize_holdings(df)
+        if df is not None and (best is None or len(df) > len(best)): best = df
+    return best
+
+def extract_row_text_per_row(driver):
+    # 原本 scraper.extract_row_text 的實作：每一列都是一次 WebDriver round trip
+    from selenium.webdriver.common.by import By
+    processed_data = []
+    for row in driver.find_elements(By.XPATH, "//table//tr"):
+        row_text = driver.execute_script("return arguments[0].innerText;", row).strip()
+        if not row_text or not any(char.isdigit() for char in row_text): continue
+        parts = [p.strip() for p in row_text.replace('\t', '\n').split('\n') if p.strip() != ""]
+        if len(parts) < 3: continue
+        code = next((p for p in parts if p.isdigit() and len(p) == 4), None)
+        if not code: continue
+        idx = parts.index(code)
+        name = parts[idx + 1] if idx + 1 < len(parts) else "未知"
+        weight = next((p for p in parts if '%' in p), "0")
+        shares = next((p for p in parts if ',' in p and '%' not in p), "0")
+        processed_data.append([code, name, shares, weight])
+    if not processed_data: return None
+    return normalize_holdings(pd.DataFrame(processed_data, columns=HOLDING_COLUMNS))
+
+def best_of(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def bench_offline(repeat):
+    for code, name in FIXTURES.items():
+        with open(f"{FIXTURE_DIR}/{name}", encoding="utf-8") as f: html = f.read()
+        t_tables, tables = best_of(html_tables, html, repeat=repeat)
+        t_bulk, df = best_of(lambda: parse_holdings_tables(tables) if code != "00991A" else
+                             parse_holdings_rows([r for t in tables for r in t]), repeat=repeat)
+        line = f"⏱️ [{code}] lxml 取表 {t_tables * 1000:.2f} ms + 解析 {t_bulk * 1000:.2f} ms ({len(df)} 筆)"
+        if code != "00991A":  # 復華的表頭不在 <table> 裡，pd.read_html 本來就解析不出來
+            t_old, old = best_of(parse_read_html, html, repeat=repeat)
+            pd.testing.assert_frame_equal(old, df)
+            line += f" / pd.read_html {t_old * 1000:.2f} ms (x{t_old / (t_tables + t_bulk):.1f})，輸出一致"
+        print(line)
+
+def bench_browser(repeat):
+    try:
+        from scraper import get_driver, extract_row_text, extract_table
+        driver = get_driver()
+    except Exception as e:
+        print(f"ℹ️ 無法啟動 Chrome ({type(e).__name__})，略過瀏覽器測試")
+        return
+    server, base_url = serve_fixtures()
+    try:
+        driver.get(f"{base_url}/{FIXTURES['00991A']}")
+        t_old, old = best_of(extract_row_text_per_row, driver, repeat=repeat)
+        t_new, new = best_of(extract_row_text, driver, None, repeat=repeat)
+        pd.testing.assert_frame_equal(old, new)
+        print(f"⏱️ [00991A] 逐列 {t_old * 1000:.1f} ms / 一次取表 {t_new * 1000:.1f} ms (x{t_old / t_new:.1f})，輸出一致")
+        driver.get(f"{base_url}/{FIXTURES['00981A']}")
+        t_old, old = best_of(lambda: parse_read_html(driver.page_source), repeat=repeat)
+        t_new, new = best_of(extract_table, driver, None, repeat=repeat)
+        pd.testing.assert_frame_equal(old, new)
+        print(f"⏱️ [00981A] page_source + read_html {t_old * 1000:.1f} ms / 一次取表 {t_new * 1000:.1f} ms (x{t_old / t_new:.1f})，輸出一致")
+    finally:
+        server.shutdown()
+        driver.quit()
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    bench_offline(repeat)
+    bench_browser(repeat)
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import numpy as np
+import pandas as pd
+
+from etfcore.storage import DATA_DIR, read_history
+from etfcore.comparison import get_comparison
+from etfcore.pipeline import load_snapshots, clean_data
+from etfcore.trends import build_trends
+from etfcore.windows import ShareMatrix, window_changes
+from benchmarks.synthetic import make_history
+
+# ==========================================
+# 儀表板熱路徑的 benchmark (不需要 Streamlit、不需要網路)
+#   python -m benchmarks.suite                       → 跑全部規模，結果寫 benchmarks/results.json
+#   python -m benchmarks.suite --scales real 10x     → 只跑部分規模
+#   python -m benchmarks.suite --update-baseline     → 把這次結果存成基準
+# 每個項目取最快一次；超過 max(基準 × tolerance, 基準 + slack) 算退步，程式以 exit code 1 結束 (可接 CI)
+# 每次同時量一個固定的參考工作量 (reference_ms)，基準依「這次 / 建基準時」的參考時間換算，機器快慢不同也能比
+# 超過門檻的規模會重跑 (--retries)，取每個項目的最快值再判斷，偶發的雜訊不會被當成退步
+# ==========================================
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_TOLERANCE = 2.0
+DEFAULT_SLACK_MS = 5.0  # 幾毫秒的項目受雜訊影響大，門檻至少比基準多這麼多
+SYNTHETIC_CODE = "SYN"
+# 真實資料約 50 檔 × 180 天；合成資料的筆數放大 10 / 100 倍 (天數與持股數都加大)
+SCALES = {
+    "real": None,
+    "10x": (160, 560),
+    "100x": (500, 1800),
+}
+REPEAT = {"real": 7, "10x": 5, "100x": 3}
+DEFAULT_RETRIES = 2
+REFERENCE_REPEAT = 9
+
+def best_of(func, setup=None, repeat=5):
+    """setup() 的結果當參數傳給 func，不算進時間"""
+    best = float("inf")
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench_fund(etf_code, data_dir, repeat):
+    """一檔基金的各熱路徑，回傳 {項目: 秒}"""
+    snaps = load_snapshots(etf_code, data_dir)
+    if snaps is None or len(snaps) < 2: return {}
+    prev = snaps.back(0, 1)
+    raw = read_history(etf_code, data_dir=data_dir)
+
+    def etl_window():
+        snaps.memo.pop("share_matrix", None)  # 含鋪矩陣 (每個資料版本一次) 的最差情況
+        window_changes(snaps, 0, 5)
+
+    return {
+        "app.load_data": best_of(lambda: load_snapshots(etf_code, data_dir), repeat=repeat),
+        "app.get_comparison": best_of(lambda: get_comparison(snaps, snaps.dates[0], snaps.dates[prev]), repeat=repeat),
+        "etl.clean_data": best_of(clean_data, setup=lambda: (raw.copy(),), repeat=repeat),
+        "etl.share_matrix": best_of(lambda: ShareMatrix(snaps), repeat=repeat),
+        "etl.window_block": best_of(etl_window, repeat=repeat),
+        "etl.window_cached": best_of(lambda: window_changes(snaps, 0, 60), repeat=repeat),
+        "etl.get_trend_data": best_of(lambda: build_trends(snaps, 0, 30), repeat=repeat),
+    }
+
+def reference_workload(rows=200_000, seed=0):
+    """跟專案程式碼無關的固定 pandas / numpy 工作量，只用來量這台機器這一刻的速度"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"key": rng.integers(0, 2000, rows), "value": rng.random(rows)})
+
+    def work():
+        g = df.groupby("key")["value"].agg(["sum", "max"])
+        df.merge(g, left_on="key", right_index=True).sort_values(["key", "value"])
+    return work
+
+def reference_ms(repeat=REFERENCE_REPEAT):
+    return round(best_of(reference_workload(), repeat=repeat) * 1000, 3)
+
+def real_codes(data_dir=DATA_DIR):
+    return sorted(f.split("_")[0] for f in os.listdir(data_dir) if f.endswith("_history.csv"))
+
+def run_scale(scale, repeat):
+    """回傳 {'基金/規模': {項目: 毫秒}}"""
+    results = {}
+    if SCALES[scale] is None:
+        for etf_code in real_codes():
+            for name, sec in bench_fund(etf_code, DATA_DIR, repeat).items():
+                results.setdefault(f"{scale}/{etf_code}", {})[name] = round(sec * 1000, 3)
+        return results
+    n_holdings, n_days = SCALES[scale]
+    with tempfile.TemporaryDirectory() as tmp:
+        df = make_history(n_holdings, n_days)
+        df.assign(Date=df['Date'].dt.strftime('%Y-%m-%d')).to_csv(f"{tmp}/{SYNTHETIC_CODE}_history.csv", index=False, encoding="utf-8-sig")
+        print(f"📦 {scale}: 合成 {n_holdings} 檔 × {n_days} 天 = {len(df):,} 筆")
+        for name, sec in bench_fund(SYNTHETIC_CODE, tmp, repeat).items():
+            results.setdefault(f"{scale}/{SYNTHETIC_CODE}", {})[name] = round(sec * 1000, 3)
+    return results
+
+def merge_fastest(results, rerun):
+    """重跑的結果併回去，每個項目留最快的一次"""
+    for group, cases in rerun.items():
+        for name, ms in cases.items():
+            old = results.setdefault(group, {}).get(name)
+            results[group][name] = ms if old is None else min(old, ms)
+    return results
+
+def compare_baseline(results, baseline, tolerance, slack_ms=DEFAULT_SLACK_MS, speed=1.0):
+    """每個項目加上 baseline_ms / limit_ms / status (ok / regression / new)
+    speed 是這次參考時間 / 建基準時的參考時間，基準先乘上它換算成這台機器的毫秒"""
+    report, regressions = {}, []
+    for group, cases in results.items():
+        for name, ms in cases.items():
+            base = baseline.get(group, {}).get(name)
+            entry = {"ms": ms}
+            if base is None:
+                entry["status"] = "new"
+            else:
+                base = base * speed
+                limit = round(max(base * tolerance, base + slack_ms), 3)
+                entry.update(baseline_ms=round(base, 3), limit_ms=limit, status="regression" if ms > limit else "ok")
+                if ms > limit: regressions.append(f"{group} {name}: {ms:.1f} ms > {limit:.1f} ms")
+            report.setdefault(group, {})[name] = entry
+    return report, regressions
+
+def load_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="儀表板熱路徑 benchmark")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    parser.add_argument("--out", default=RESULTS_PATH, help="結果 JSON 路徑")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基準 JSON 路徑")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="超過 基準 × 倍數 算退步")
+    parser.add_argument("--slack-ms", type=float, default=DEFAULT_SLACK_MS, help="門檻至少比基準多幾毫秒")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="超過門檻的規模最多重跑幾次")
+    parser.add_argument("--update-baseline", action="store_true", help="把這次結果寫成新的基準")
+    args = parser.parse_args(argv)
+
+    ref_ms = reference_ms()
+    print(f"📏 參考工作量 {ref_ms:.1f} ms")
+    results = {}
+    for scale in args.scales:
+        results.update(run_scale(scale, REPEAT[scale]))
+    for group, cases in results.items():
+        print(f"⏱️ {group}: " + " / ".join(f"{k} {v:.1f} ms" for k, v in cases.items()))
+
+    baseline = load_json(args.baseline)
+    base_ref = baseline.get("meta", {}).get("reference_ms")
+    speed = ref_ms / base_ref if base_ref else 1.0
+    report, regressions = compare_baseline(results, baseline.get("results", {}), args.tolerance, args.slack_ms, speed)
+    for attempt in range(args.retries if not args.update_baseline else 0):
+        if not regressions: break
+        scales = sorted({r.split("/", 1)[0] for r in regressions}, key=list(SCALES).index)
+        print(f"🔁 {', '.join(scales)} 超過門檻，重跑確認 ({attempt + 1}/{args.retries})")
+        ref_ms = min(ref_ms, reference_ms())
+        speed = ref_ms / base_ref if base_ref else 1.0
+        for scale in scales:
+            merge_fastest(results, run_scale(scale, REPEAT[scale]))
+        report, regressions = compare_baseline(results, baseline.get("results", {}), args.tolerance, args.slack_ms, speed)
+    meta = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "pandas": pd.__version__, "machine": platform.machine(), "reference_ms": ref_ms,
+            "speed": round(speed, 3), "tolerance": args.tolerance, "slack_ms": args.slack_ms}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": report}, f, ensure_ascii=False, indent=2)
+    print(f"📝 結果寫入 {args.out}")
+
+    if args.update_baseline:
+        # 沒重跑的規模沿用舊基準，先換算到這次的參考時間
+        merged = {g: {k: round(v * speed, 3) for k, v in cases.items()} for g, cases in baseline.get("results", {}).items()}
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": merged}, f, ensure_ascii=False, indent=2)
+        print(f"📌 基準已更新：{args.baseline}")
+        return 0
+    if regressions:
+        print("🚨 效能退步：\n" + "\n".join(f"  {r}" for r in regressions))
+        return 1
+    print("✅ 沒有超過門檻的項目" if baseline else "ℹ️ 尚無基準 (--update-baseline 建立)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 合成持股歷史：給 benchmark 用，欄位/型態與 storage.read_history 相同
+# ==========================================
+def make_history(n_holdings=500, n_days=1000, churn=0.02, seed=0):
+    """每天約 churn 比例的持股換手，其餘股數隨機加減碼；回傳依日期遞增的 DataFrame"""
+    rng = np.random.default_rng(seed)
+    universe = np.arange(1000, 1000 + n_holdings * 4)
+    names = np.array([f"合成{c}" for c in universe], dtype=object)
+    dates = pd.bdate_range("2020-01-01", periods=n_days)
+
+    held = rng.choice(len(universe), n_holdings, replace=False)
+    shares = rng.integers(1, 500, n_holdings) * 1000
+    frames = []
+    for date in dates:
+        n_swap = rng.binomial(n_holdings, churn)
+        if n_swap:
+            out = rng.choice(n_holdings, n_swap, replace=False)
+            pool = np.setdiff1d(np.arange(len(universe)), held)
+            held[out] = rng.choice(pool, n_swap, replace=False)
+            shares[out] = rng.integers(1, 500, n_swap) * 1000
+        moves = rng.random(n_holdings) < 0.3
+        shares = np.where(moves, np.maximum(shares + rng.integers(-20, 21, n_holdings) * 1000, 1000), shares)
+        weight = shares / shares.sum() * 100
+        frames.append(pd.DataFrame({
+            'Date': date,
+            '股票代號': universe[held].astype(str),
+            '股票名稱': names[held],
+            '持有股數': shares.astype('int64'),
+            '權重': weight.astype('float32'),
+        }))
+    return pd.concat(frames, ignore_index=True)
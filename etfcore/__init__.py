@@ -0,0 +1,38 @@
+import importlib
+
+# ==========================================
+# etfcore：資料與運算核心 (讀寫歷史、清洗、比對、分類、衍生資料)
+# 不 import streamlit / plotly / selenium；UI (app.py、etl.py) 與爬蟲 (update_data.py、scraper.py) 都建在它上面。
+# 常用名稱可直接 `from etfcore import get_diff`；子模組第一次用到才載入 (PEP 562)，
+# 所以 `import etfcore` 本身不會拉進 pandas。
+# ==========================================
+_EXPORTS = {
+    "DATA_DIR": "storage", "csv_path": "storage", "read_history": "storage", "append_snapshot": "storage",
+    "FrameCache": "cache",
+    "compact_holdings": "holdings", "expand_holdings": "holdings",
+    "SnapshotIndex": "snapshots",
+    "compare_snapshots": "comparison", "get_comparison": "comparison",
+    "get_trends": "trends",
+    "classify_industry": "industry", "industry_lookup": "industry",
+    "build_diffs": "diffs", "read_diffs": "diffs", "get_diff": "diffs",
+    "HoldingsMatrix": "consensus", "ensure_matrix": "consensus",
+    "PositionLifecycle": "lifecycle", "ensure_lifecycle": "lifecycle",
+    "PriceMatrix": "prices", "load_prices": "prices", "add_flows": "prices",
+    "ShareMatrix": "windows", "window_changes": "windows",
+    "load_snapshots": "pipeline", "load_etl_snapshots": "pipeline", "clean_data": "pipeline",
+    "FUNDS": "funds", "get_fund": "funds",
+    "save_snapshot": "ingest",
+    "fund_report": "report", "build_reports": "report",
+    "span": "tracing", "traced": "tracing",
+}
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
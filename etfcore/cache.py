@@ -0,0 +1,119 @@
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# ==========================================
+# 行程共用的 DataFrame 快取
+# key = 檔案路徑 (+ 標籤)，存的時候記下 mtime/size 與內容雜湊：
+#   - mtime/size 沒變 → 直接命中
+#   - 只有 mtime 變 (git checkout、touch) 但內容雜湊相同 → 仍算命中
+#   - 內容真的變了 → 重算
+# 超過記憶體上限時淘汰最久沒用的 (LRU)；存進去之後 memo 長大的物件，下次命中時重新估大小
+# ==========================================
+DEFAULT_MAX_BYTES = int(os.environ.get("ETF_CACHE_MB", "512")) * 1024 * 1024
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def file_digest(path):
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+def estimate_bytes(value):
+    """大約的記憶體用量；包著 DataFrame 的物件連 memo 裡的衍生結果 (矩陣、趨勢線、異動表) 一起算"""
+    if value is None: return 0
+    if isinstance(value, pd.DataFrame): n = int(value.memory_usage(deep=True).sum())
+    elif isinstance(value, pd.Series): n = int(value.memory_usage(deep=True))
+    elif isinstance(getattr(value, "nbytes", None), int): n = value.nbytes  # numpy 陣列、ShareMatrix、HoldingsMatrix、PositionLifecycle
+    elif hasattr(value, "frame"): n = estimate_bytes(value.frame)  # SnapshotIndex 等包著 DataFrame 的物件
+    elif isinstance(value, dict): n = sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in list(value.items()))
+    elif isinstance(value, (list, tuple)): n = sys.getsizeof(value) + sum(estimate_bytes(v) for v in list(value))
+    else: n = sys.getsizeof(value)
+    memo = getattr(value, "memo", None)
+    if isinstance(memo, dict): n += estimate_bytes(memo)
+    return n
+
+def memo_size(value):
+    """memo 只會加不會改，筆數變了就代表要重新估大小"""
+    memo = getattr(value, "memo", None)
+    return len(memo) if isinstance(memo, dict) else 0
+
+class FrameCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> [signature, digest, value, nbytes, memo 筆數]
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key, path, sig):
+        entry = self._entries.get(key)
+        if entry is None: return None
+        if entry[0] == sig: return entry
+        # mtime 變了但大小一樣 → 比內容雜湊
+        if sig is not None and entry[0] is not None and entry[0][1] == sig[1] and entry[1] == file_digest(path):
+            entry[0] = sig
+            return entry
+        return None
+
+    def get(self, path, loader, tag=None):
+        """命中只花一次 os.stat + dict 查詢；回傳的物件是共用的，呼叫端不要就地修改"""
+        key = (path, tag)
+        sig = file_signature(path)
+        with self._lock:
+            entry = self._lookup(key, path, sig)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if memo_size(entry[2]) != entry[4]:
+                    self._account(entry)
+                    self._evict()
+                return entry[2]
+            self.misses += 1
+        digest = file_digest(path) if sig is not None else None
+        value = loader()
+        nbytes = estimate_bytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None: self._bytes -= old[3]
+            self._entries[key] = [sig, digest, value, nbytes, memo_size(value)]
+            self._bytes += nbytes
+            self._evict()
+        return value
+
+    def _account(self, entry):
+        nbytes = estimate_bytes(entry[2])
+        self._bytes += nbytes - entry[3]
+        entry[3], entry[4] = nbytes, memo_size(entry[2])
+
+    def _evict(self):
+        while self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[3]
+            self.evictions += 1
+
+    def invalidate(self, path=None):
+        with self._lock:
+            keys = list(self._entries) if path is None else [k for k in self._entries if k[0] == path]
+            for key in keys: self._bytes -= self._entries.pop(key)[3]
+
+    def stats(self):
+        with self._lock:
+            for entry in self._entries.values():
+                if memo_size(entry[2]) != entry[4]: self._account(entry)
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": self._bytes, "evictions": self.evictions}
@@ -0,0 +1,101 @@
+import csv
+import argparse
+from .index import STATUS_NEW, STATUS_EXIT, STATUS_ADD, STATUS_CUT, STATUS_FLAT, trading_dates, diff_path, is_fresh
+
+# ==========================================
+# 命令列工具：python -m etfcore <指令>
+#   diff 00981A [--date YYYY-MM-DD] [--lag 1|5] [--all]   → 印出某天的持股異動
+#   report [代號...] [--format md|json|csv] [--out 檔案]     → 全部基金的異動摘要 (多行程)
+# 交易日曆取自歷史檔的索引、異動表的依據也只看索引 (etfcore/index.py，只用標準函式庫)；
+# 依據還對得上就用 csv 模組讀 data/diffs，不載入 pandas。缺檔或過期的日期才退回 etfcore.diffs 現場比對。
+# ==========================================
+STATUS_ORDER = [STATUS_NEW, STATUS_EXIT, STATUS_ADD, STATUS_CUT, STATUS_FLAT]
+
+def _num(val):
+    try: return float(val)
+    except (TypeError, ValueError): return 0.0
+
+def read_stored(etf_code, date_str, lag, data_dir):
+    """預先算好的異動表；這天沒有檔案、已過期、或沒有這個 lag 的基準日就回傳 None"""
+    dates = trading_dates(etf_code, data_dir)
+    if date_str not in dates or not is_fresh(etf_code, date_str, data_dir): return None
+    base = dates[max(dates.index(date_str) - lag, 0)]
+    with open(diff_path(etf_code, date_str, data_dir), encoding="utf-8-sig", newline="") as f:
+        rows = [r for r in csv.DictReader(f) if r['基準日'] == base]
+    return rows or None
+
+def compute_live(etf_code, date_str, lag, data_dir):
+    # 慢路徑：載入 pandas 與整份歷史
+    from .pipeline import load_snapshots
+    from .diffs import get_diff
+    snaps = load_snapshots(etf_code, data_dir)
+    if snaps is None or not len(snaps) or (date_str and date_str not in snaps.date_strs): return None
+    pos = snaps.position(date_str) if date_str else 0
+    merged = get_diff(snaps, etf_code, pos, snaps.back(pos, lag), data_dir)
+    base = snaps.date_strs[snaps.back(pos, lag)]
+    return [dict(row, Date=snaps.date_strs[pos], 基準日=base) for row in merged.astype(str).to_dict("records")]
+
+def format_diff(etf_code, rows, show_all=False):
+    lines = [f"📅 {etf_code} {rows[0]['Date']} vs {rows[0]['基準日']}"]
+    for status in STATUS_ORDER:
+        if status == STATUS_FLAT and not show_all: continue
+        group = sorted((r for r in rows if r['狀態'] == status), key=lambda r: -abs(_num(r['股數增減'])))
+        if not group: continue
+        lines.append(f"{status} {len(group)} 檔")
+        for r in group:
+            lines.append(f"   {r['股票名稱']}({r['股票代號']}) {_num(r['股數增減']):+,.0f} 股"
+                         f"  權重 {_num(r['權重_今']):.2f}% ({_num(r['權重增減']):+.2f})")
+    return "\n".join(lines)
+
+def cmd_diff(args):
+    dates = trading_dates(args.etf, args.data_dir)
+    if args.date and args.date not in dates:
+        print(f"⚠️ {args.etf} 沒有 {args.date} 這一天的資料 (日期格式 YYYY-MM-DD)")
+        return 1
+    date_str = args.date or (dates or [None])[-1]
+    rows = read_stored(args.etf, date_str, args.lag, args.data_dir) if date_str else None
+    if rows is None: rows = compute_live(args.etf, args.date, args.lag, args.data_dir)
+    if not rows:
+        print(f"⚠️ {args.etf} 沒有資料")
+        return 1
+    print(format_diff(args.etf, rows, args.all))
+    return 0
+
+def cmd_report(args):
+    from .report import DEFAULT_MEMORY_MB, FORMATTERS, build_reports
+    from .funds import fund_codes
+    reports = build_reports(args.etfs or fund_codes(), args.date, args.lag, args.top,
+                            args.workers, args.memory_mb or DEFAULT_MEMORY_MB, args.data_dir)
+    if not reports:
+        print("⚠️ 沒有資料")
+        return 1
+    text = FORMATTERS[args.format](reports)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: f.write(text)
+        print(f"📝 已寫入 {args.out}")
+    else:
+        print(text)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m etfcore", description="主動式 ETF 持股資料工具")
+    parser.add_argument("--data-dir", default="data", help="資料目錄 (預設 data)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("diff", help="印出某天的持股異動")
+    p.add_argument("etf", help="基金代號，例如 00981A")
+    p.add_argument("--date", help="日期 YYYY-MM-DD (預設最新一天)")
+    p.add_argument("--lag", type=int, default=1, help="跟前幾個交易日比 (預設 1；1 / 5 有預先算好)")
+    p.add_argument("--all", action="store_true", help="連持平的也列出")
+    p.set_defaults(func=cmd_diff)
+    p = sub.add_parser("report", help="全部基金的異動摘要")
+    p.add_argument("etfs", nargs="*", help="基金代號 (預設 etfcore/funds.py 全部)")
+    p.add_argument("--date", help="日期 YYYY-MM-DD (預設各基金最新一天)")
+    p.add_argument("--lag", type=int, default=1, help="跟前幾個交易日比 (預設 1)")
+    p.add_argument("--top", type=int, default=5, help="每類列出前幾名 (依股數增減)")
+    p.add_argument("--format", choices=["md", "json", "csv"], default="md")
+    p.add_argument("--out", help="寫到檔案 (預設印在螢幕)")
+    p.add_argument("--workers", type=int, help="最多幾個行程 (預設依 CPU 與記憶體預算)")
+    p.add_argument("--memory-mb", type=int, help="所有行程合計的記憶體預算 (預設 ETF_REPORT_MEMORY_MB 或 1024)")
+    p.set_defaults(func=cmd_report)
+    args = parser.parse_args(argv)
+    return args.func(args)
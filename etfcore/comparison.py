@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from .snapshots import SnapshotIndex
+from .index import STATUS_NEW, STATUS_EXIT, STATUS_ADD, STATUS_CUT, STATUS_FLAT
+
+# ==========================================
+# 兩天持股比對 (app.py 的操盤重點 / 熱力圖 / 明細表都用這份結果)
+# 狀態標籤 (STATUS_*) 定義在 etfcore/index.py，命令列不載入 pandas 也能用
+# ==========================================
+
+def comparison_status(shares_now, shares_prev):
+    """依今/昨股數貼標籤，規則順序與舊版 determine_status 相同"""
+    now = np.asarray(shares_now, dtype='float64')
+    prev = np.asarray(shares_prev, dtype='float64')
+    delta = now - prev
+    return np.select(
+        [(prev == 0) & (now > 0), (prev > 0) & (now == 0), delta > 0, delta < 0],
+        [STATUS_NEW, STATUS_EXIT, STATUS_ADD, STATUS_CUT],
+        default=STATUS_FLAT,
+    ).astype(object)
+
+def compare_snapshots(df_curr, df_base):
+    merged = pd.merge(
+        df_curr[['股票代號', '股票名稱', '持有股數', '權重']],
+        df_base[['股票代號', '持有股數', '權重']],
+        on='股票代號', how='outer', suffixes=('_今', '_昨')
+    )
+    # 剔除的股票今天沒有名稱 → 從基準日查 (每個代號取第一筆，跟舊版逐列查一樣)
+    base_names = df_base.drop_duplicates('股票代號').set_index('股票代號')['股票名稱']
+    merged['股票名稱'] = merged['股票名稱'].fillna(merged['股票代號'].map(base_names))
+    merged = merged.fillna(0)
+
+    merged['股數增減'] = merged['持有股數_今'] - merged['持有股數_昨']
+    merged['權重增減'] = merged['權重_今'] - merged['權重_昨']
+    merged['狀態'] = comparison_status(merged['持有股數_今'], merged['持有股數_昨'])
+    return merged
+
+def get_comparison(df, current_date, base_date):
+    """df 可以是 SnapshotIndex (直接切片) 或一般 DataFrame (逐日布林篩選)"""
+    if isinstance(df, SnapshotIndex):
+        return compare_snapshots(df.get(current_date), df.get(base_date))
+    return compare_snapshots(df[df['Date'] == current_date], df[df['Date'] == base_date])
@@ -0,0 +1,247 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from .storage import DATA_DIR, csv_path, read_history, load_index
+from .holdings import first_per_day
+
+# ==========================================
+# 跨基金持股矩陣：日期 × 股票 × 基金 → 股數 / 權重
+#   data/consensus_matrix.npz    → 矩陣本體 (numpy，不需要 pyarrow)
+#   data/consensus_matrix.json   → 每檔基金對應的 CSV 大小，用來判斷是否過期
+# 日期軸是所有基金交易日的聯集；某檔基金那天沒有快照 (網站沒更新、還沒成立後的空檔)
+# 就沿用它前一筆快照，所以任兩個日期都能直接相減。
+# 爬蟲存檔後由 etfcore.ingest.save_snapshot 增量更新；CSV 被 git pull 換掉時由 ensure_matrix 補算。
+# ==========================================
+MATRIX_FILE = "consensus_matrix.npz"
+MATRIX_PATH = f"{DATA_DIR}/{MATRIX_FILE}"
+
+def matrix_path_for(data_dir=DATA_DIR, matrix_path=None):
+    """矩陣跟著資料目錄走 (沒指定時放在 data_dir 底下)，別的目錄的存檔不會動到 data/ 的矩陣"""
+    return matrix_path or os.path.join(data_dir, MATRIX_FILE)
+
+def source_path(matrix_path=MATRIX_PATH):
+    return os.path.splitext(matrix_path)[0] + ".json"
+
+class HoldingsMatrix:
+    def __init__(self, funds=()):
+        self.funds = list(funds)
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.codes = np.array([], dtype=str)
+        self.names = np.array([], dtype=str)
+        self.shares = np.zeros((0, 0, len(self.funds)), dtype='int64')
+        self.weight = np.zeros((0, 0, len(self.funds)), dtype='float32')
+        self.observed = np.zeros((0, len(self.funds)), dtype=bool)  # 這天這檔基金真的有快照
+        self._reindex()
+
+    def _reindex(self):
+        self._fund_pos = {f: i for i, f in enumerate(self.funds)}
+        self._code_pos = {c: i for i, c in enumerate(self.codes)}
+
+    @property
+    def nbytes(self):
+        return int(self.shares.nbytes + self.weight.nbytes + self.observed.nbytes)
+
+    # --- 存讀 ---
+    @classmethod
+    def load(cls, path=MATRIX_PATH):
+        if not os.path.exists(path): return cls()
+        with np.load(path, allow_pickle=False) as z:
+            m = cls(list(z["funds"]))
+            for key in ("dates", "codes", "names", "shares", "weight", "observed"): setattr(m, key, z[key])
+        m._reindex()
+        return m
+
+    def save(self, path=MATRIX_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, funds=np.array(self.funds, dtype=str), dates=self.dates, codes=self.codes, names=self.names,
+                 shares=self.shares, weight=self.weight, observed=self.observed)
+        os.replace(tmp, path)
+
+    # --- 擴充軸 ---
+    def _fund_index(self, fund):
+        fi = self._fund_pos.get(fund)
+        if fi is not None: return fi
+        self.funds.append(fund)
+        self.shares = np.concatenate([self.shares, np.zeros(self.shares.shape[:2] + (1,), dtype='int64')], axis=2)
+        self.weight = np.concatenate([self.weight, np.zeros(self.weight.shape[:2] + (1,), dtype='float32')], axis=2)
+        self.observed = np.concatenate([self.observed, np.zeros((len(self.dates), 1), dtype=bool)], axis=1)
+        self._reindex()
+        return len(self.funds) - 1
+
+    def _ensure_dates(self, dates):
+        """加入新日期 (保持遞增)；有插入就回傳 True，呼叫端要重新往前填"""
+        merged = np.union1d(self.dates, np.asarray(dates, dtype='datetime64[D]'))
+        if len(merged) == len(self.dates): return False
+        pos = np.searchsorted(merged, self.dates)
+        shape = (len(merged),) + self.shares.shape[1:]
+        shares, weight = np.zeros(shape, dtype='int64'), np.zeros(shape, dtype='float32')
+        observed = np.zeros((len(merged), len(self.funds)), dtype=bool)
+        shares[pos], weight[pos], observed[pos] = self.shares, self.weight, self.observed
+        self.dates, self.shares, self.weight, self.observed = merged, shares, weight, observed
+        return True
+
+    def _code_indices(self, codes, names):
+        # 同一檔股票各家寫法不同 (台積電 / 台灣積體電路製造)，顯示名稱留最短的
+        for code, name in zip(codes, names):
+            ci = self._code_pos.get(code)
+            if ci is None:
+                self._code_pos[code] = len(self.codes)
+                self.codes = np.append(self.codes, code)
+                self.names = np.append(self.names, name)
+            elif len(name) < len(self.names[ci]):
+                self.names[ci] = name
+        extra = len(self.codes) - self.shares.shape[1]
+        if extra:
+            pad = ((0, 0), (0, extra), (0, 0))
+            self.shares, self.weight = np.pad(self.shares, pad), np.pad(self.weight, pad)
+        return np.array([self._code_pos[c] for c in codes], dtype='int64')
+
+    # --- 寫入 ---
+    def _assign(self, fi, df):
+        di = np.searchsorted(self.dates, df['Date'].to_numpy().astype('datetime64[D]'))
+        ci = self._code_indices(df['股票代號'].astype(str).tolist(), df['股票名稱'].astype(str).tolist())
+        days = np.unique(di)
+        self.shares[days, :, fi] = 0
+        self.weight[days, :, fi] = 0
+        self.shares[di, ci, fi] = df['持有股數'].to_numpy(dtype='int64')
+        self.weight[di, ci, fi] = df['權重'].to_numpy(dtype='float32')
+        self.observed[days, fi] = True
+
+    def _fill(self, fi):
+        """沒有快照的日期沿用前一筆；第一筆快照之前都是 0"""
+        obs = self.observed[:, fi]
+        src = np.maximum.accumulate(np.where(obs, np.arange(len(obs)), -1))
+        fill = ~obs & (src >= 0)
+        self.shares[fill, :, fi] = self.shares[src[fill], :, fi]
+        self.weight[fill, :, fi] = self.weight[src[fill], :, fi]
+        self.shares[src < 0, :, fi] = 0
+        self.weight[src < 0, :, fi] = 0
+
+    def _write(self, fund, df, replace):
+        df = first_per_day(df)
+        fi = self._fund_index(fund)
+        if replace:
+            self.shares[:, :, fi] = 0
+            self.weight[:, :, fi] = 0
+            self.observed[:, fi] = False
+        inserted = self._ensure_dates(df['Date'].to_numpy())
+        if len(df): self._assign(fi, df)
+        for i in (range(len(self.funds)) if inserted else [fi]): self._fill(i)
+
+    def replace_fund(self, fund, df):
+        """整檔基金重算 (df 是 storage.read_history 的格式)"""
+        self._write(fund, df, replace=True)
+
+    def set_snapshot(self, fund, date_str, df):
+        """只寫一天 (爬蟲存檔後的增量更新)"""
+        self._write(fund, df.assign(Date=pd.Timestamp(date_str)), replace=False)
+
+    # --- 查詢 ---
+    def position(self, date):
+        """日期 → 位置 (那天或之前最近的一天)；比最早還早回傳 -1"""
+        return int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date), 'D'), side='right')) - 1
+
+    def back(self, pos, n):
+        """往前 n 個交易日 (聯集日曆)，超出就停在最早一天"""
+        return max(pos - n, 0)
+
+    def consensus(self, date, base_date):
+        """每檔股票在 date 相對 base_date 有幾家買、幾家賣、幾家持有
+        兩天都已經有快照的基金才列入比較"""
+        pos, base = self.position(date), self.position(base_date)
+        if pos < 0 or base < 0: return pd.DataFrame()
+        live = self.observed[:base + 1].any(axis=0)
+        now, prev = self.shares[pos][:, live], self.shares[base][:, live]
+        weight = self.weight[pos][:, live]
+        funds = np.array(self.funds)[live]
+        delta = now - prev
+        buy, sell, held = delta > 0, delta < 0, now > 0
+        keep = held.any(axis=1) | (prev > 0).any(axis=1)
+
+        def who(mask):
+            return ["、".join(funds[row]) for row in mask[keep]]
+
+        out = pd.DataFrame({
+            '股票代號': self.codes[keep], '股票名稱': self.names[keep],
+            '持有家數': held[keep].sum(axis=1), '加碼家數': buy[keep].sum(axis=1), '減碼家數': sell[keep].sum(axis=1),
+            '新進家數': (buy & (prev == 0))[keep].sum(axis=1), '剔除家數': (sell & (now == 0))[keep].sum(axis=1),
+            '合計權重': weight[keep].sum(axis=1).astype('float64').round(4),
+            '加碼基金': who(buy), '減碼基金': who(sell),
+        })
+        for j, fund in enumerate(funds): out[fund] = weight[keep, j].astype('float64').round(4)
+        return out.sort_values('合計權重', ascending=False, kind='stable').reset_index(drop=True)
+
+# ==========================================
+# 增量維護 (ingest.save_snapshot 存檔後呼叫) 與過期補算
+# ==========================================
+_LOCK = threading.Lock()  # 平行爬蟲會同時存檔
+
+def _load_sources(matrix_path):
+    try:
+        with open(source_path(matrix_path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save(matrix, sources, matrix_path):
+    matrix.save(matrix_path)
+    tmp = source_path(matrix_path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(sources, f)
+    os.replace(tmp, source_path(matrix_path))
+
+def _csv_size(etf_code, data_dir):
+    path = csv_path(etf_code, data_dir)
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+def _rebuild_fund(matrix, etf_code, data_dir):
+    df = read_history(etf_code, data_dir=data_dir)
+    if df is not None: matrix.replace_fund(etf_code, df)
+
+def update_matrix(etf_code, date_str, df, data_dir=DATA_DIR, matrix_path=None):
+    """新快照寫進矩陣。矩陣只有在跟「存檔前的 CSV」同步時才做增量，
+    否則 (第一次、git pull 過、同日重跑) 整檔基金重算。"""
+    matrix_path = matrix_path_for(data_dir, matrix_path)
+    with _LOCK:
+        matrix, sources = HoldingsMatrix.load(matrix_path), _load_sources(matrix_path)
+        # 當天資料在 CSV 的起始 byte = 存檔前的檔案大小
+        before = load_index(csv_path(etf_code, data_dir))["offsets"].get(date_str)
+        if etf_code in matrix.funds and before is not None and sources.get(etf_code) == before:
+            matrix.set_snapshot(etf_code, date_str, df)
+        else:
+            _rebuild_fund(matrix, etf_code, data_dir)
+        sources[etf_code] = _csv_size(etf_code, data_dir)
+        _save(matrix, sources, matrix_path)
+
+def ensure_matrix(etf_codes, data_dir=DATA_DIR, matrix_path=None):
+    """確認矩陣跟各基金 CSV 同步 (每檔一次 os.stat)；過期的基金重算，回傳重算了哪些"""
+    matrix_path = matrix_path_for(data_dir, matrix_path)
+    sources = _load_sources(matrix_path)
+    fresh = os.path.exists(matrix_path)
+    stale = [c for c in etf_codes if not fresh or sources.get(c) != _csv_size(c, data_dir)]
+    if not stale: return []
+    with _LOCK:
+        matrix, sources = HoldingsMatrix.load(matrix_path), _load_sources(matrix_path)
+        for etf_code in stale:
+            _rebuild_fund(matrix, etf_code, data_dir)
+            sources[etf_code] = _csv_size(etf_code, data_dir)
+        _save(matrix, sources, matrix_path)
+    return stale
+
+if __name__ == "__main__":
+    # python -m etfcore.consensus   → 重建矩陣並印出最新一天的 5 日共識
+    import time
+    from .funds import fund_codes
+    for f in (MATRIX_PATH, source_path()):
+        if os.path.exists(f): os.remove(f)
+    t0 = time.perf_counter()
+    ensure_matrix(fund_codes())
+    t1 = time.perf_counter()
+    m = HoldingsMatrix.load()
+    t2 = time.perf_counter()
+    table = m.consensus(m.dates[-1], m.dates[m.back(len(m.dates) - 1, 5)])
+    t3 = time.perf_counter()
+    print(f"📦 矩陣 {len(m.dates)} 天 × {len(m.codes)} 檔 × {len(m.funds)} 基金 ({m.nbytes / 1024:,.0f} KB)")
+    print(f"⏱️ 重建 {(t1 - t0) * 1000:.0f} ms / 讀取 {(t2 - t1) * 1000:.1f} ms / 查詢 {(t3 - t2) * 1000:.1f} ms")
+    print(table[table['加碼家數'] >= 2].head(10).to_string(index=False))
@@ -0,0 +1,133 @@
+import os
+import sys
+import glob
+import shutil
+import threading
+import pandas as pd
+from .storage import DATA_DIR, read_history
+from .index import (DIFF_LAGS, diff_dir, diff_path, sources_path, diff_stamps,  # noqa: F401 (舊的匯入位置)
+                    load_sources, save_sources, is_fresh)
+from .snapshots import SnapshotIndex
+from .holdings import first_per_day
+from .comparison import compare_snapshots
+from .tracing import span
+
+# ==========================================
+# 每日異動表：存檔當下就把比對結果算好，儀表板只讀不算
+#   data/diffs/{etf}/YYYY-MM-DD.csv → 當天對「前 1 / 前 5 個交易日」的比對 (compare_snapshots 的欄位)
+#   data/diffs/{etf}/sources.json   → 每個檔是依據哪幾天的哪份內容算的 (日期 + storage 索引的內容雜湊)
+# 檔名與依據的判斷在 etfcore/index.py (只用標準函式庫，命令列不用載入 pandas 就能判斷)。
+# 一天一個小檔：重跑某天只覆蓋那個檔，不用重寫整份歷史。
+# 異動表是衍生資料 (不進版控)：依據對不上 (git pull、同日重跑、改過較早的日期) 就不讀，
+# 由 ensure_diffs 補算 (app.py 開啟基金時自動做，同 consensus / lifecycle)；讀不到的日期現場比對。
+# 存檔時只重算當天與拿它當基準的幾天；本機還沒有異動表 (例如 CI 的新 checkout) 就不算。
+#   python -m etfcore.diffs ensure [代號...]    → 只補算過期 / 缺少的日期
+#   python -m etfcore.diffs rebuild [代號...]   → 全部歷史重算
+# ==========================================
+DIFF_COLUMNS = ['Date', '基準日', '間隔', '股票代號', '股票名稱', '持有股數_今', '權重_今',
+                '持有股數_昨', '權重_昨', '股數增減', '權重增減', '狀態']
+_LOCK = threading.Lock()  # 儀表板多個 session 會同時補算
+
+# --- 計算與存讀 ---
+def build_diffs(snaps, pos, lags=DIFF_LAGS):
+    """第 pos 天對每個 lag 的比對結果，疊成一張表 (基準日重複的 lag 只留一份)"""
+    frames, seen = [], set()
+    curr = snaps.at(pos)
+    for lag in lags:
+        base = snaps.back(pos, lag)
+        if base in seen: continue
+        seen.add(base)
+        merged = compare_snapshots(curr, snaps.at(base))
+        merged.insert(0, '間隔', lag)
+        merged.insert(0, '基準日', snaps.date_strs[base])
+        merged.insert(0, 'Date', snaps.date_strs[pos])
+        frames.append(merged)
+    df = pd.concat(frames, ignore_index=True)[DIFF_COLUMNS]
+    for col in ('權重_今', '權重_昨', '權重增減'): df[col] = df[col].astype('float64').round(4)  # 去掉 float32 的尾數
+    return df
+
+def write_diffs(etf_code, date_str, df, data_dir=DATA_DIR):
+    path = diff_path(etf_code, date_str, data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False, encoding="utf-8-sig")
+    os.replace(tmp, path)
+
+def read_diffs(etf_code, date_str, data_dir=DATA_DIR):
+    """預先算好的異動表；沒有或已過期回傳 None"""
+    if not is_fresh(etf_code, date_str, data_dir): return None
+    return pd.read_csv(diff_path(etf_code, date_str, data_dir),
+                       dtype={'股票代號': str, '股票名稱': str, 'Date': str, '基準日': str}, encoding="utf-8-sig")
+
+def _history_index(etf_code, data_dir=DATA_DIR):
+    df = read_history(etf_code, data_dir=data_dir)
+    if df is None or df.empty: return None
+    df = df[~df['股票名稱'].str.contains('查看更多|更多|Total', na=False)]
+    return SnapshotIndex(first_per_day(df))
+
+def ensure_diffs(etf_codes, data_dir=DATA_DIR, dates=None):
+    """依據對不上或缺檔的日期重算 (dates 有給時只看這幾天)、歷史裡已經沒有的日期刪掉；
+    回傳 {代號: 重算天數}"""
+    rebuilt = {}
+    for etf_code in etf_codes:
+        stamps = diff_stamps(etf_code, data_dir)
+        with _LOCK:
+            sources = load_sources(etf_code, data_dir)
+            removed = set(sources) - set(stamps)
+            for date_str in removed:
+                sources.pop(date_str)
+                if os.path.exists(diff_path(etf_code, date_str, data_dir)): os.remove(diff_path(etf_code, date_str, data_dir))
+            stale = [d for d, stamp in stamps.items() if (dates is None or d in dates)
+                     and (sources.get(d) != stamp or not os.path.exists(diff_path(etf_code, d, data_dir)))]
+            snaps = _history_index(etf_code, data_dir) if stale else None
+            for date_str in stale:
+                if snaps is None or date_str not in snaps.date_strs: continue
+                write_diffs(etf_code, date_str, build_diffs(snaps, snaps.position(date_str)), data_dir)
+                sources[date_str] = stamps[date_str]
+            if stale or removed: save_sources(etf_code, sources, data_dir)
+        rebuilt[etf_code] = len(stale)
+    return rebuilt
+
+def update_diffs(etf_code, date_str, data_dir=DATA_DIR):
+    """爬蟲存檔後呼叫：只重算依據含有當天的日期 (當天 + 之後拿它當基準的幾天)。
+    本機還沒有這檔的異動表就不算 (CI 每次都是新 checkout，算了也會丟掉)，留給儀表板開啟時補"""
+    if not os.path.exists(sources_path(etf_code, data_dir)): return 0
+    affected = {d for d, stamp in diff_stamps(etf_code, data_dir).items() if f"{date_str}:" in stamp}
+    return ensure_diffs([etf_code], data_dir, dates=affected)[etf_code]
+
+def rebuild_diffs(etf_codes=None, data_dir=DATA_DIR):
+    """整份歷史重算 (會先清掉舊的異動表)"""
+    if etf_codes is None:
+        etf_codes = [os.path.basename(p).split("_")[0] for p in sorted(glob.glob(f"{data_dir}/*_history.csv"))]
+    for etf_code in etf_codes:
+        shutil.rmtree(diff_dir(etf_code, data_dir), ignore_errors=True)
+        days = ensure_diffs([etf_code], data_dir)[etf_code]
+        print(f"✅ [{etf_code}] 異動表重算完成：{days} 天")
+    return etf_codes
+
+def get_diff(snaps, etf_code, pos, base_pos, data_dir=DATA_DIR):
+    """第 pos 天對第 base_pos 天的比對：有預先算好的就直接讀，否則 (任意基準日、還沒算) 現場比對。
+    結果記在 snaps.memo，跟著資料版本一起失效；回傳的表是共用的，不要就地修改"""
+    date_str, base_str = snaps.date_strs[pos], snaps.date_strs[base_pos]
+    key = ("diff", date_str, base_str)
+    if key not in snaps.memo:
+        with span("comparison", fund=etf_code, source="stored") as s:
+            merged = None
+            stored = read_diffs(etf_code, date_str, data_dir)
+            if stored is not None:
+                rows = stored[stored['基準日'] == base_str]
+                if not rows.empty: merged = rows.drop(columns=['Date', '基準日', '間隔']).reset_index(drop=True)
+            if merged is None:
+                s.set(source="live")
+                merged = compare_snapshots(snaps.at(pos), snaps.at(base_pos))
+        snaps.memo[key] = merged
+    return snaps.memo[key]
+
+if __name__ == "__main__":
+    # python -m etfcore.diffs ensure|rebuild [代號...]
+    from .funds import fund_codes
+    cmd, codes = (sys.argv[1] if len(sys.argv) > 1 else "ensure"), (sys.argv[2:] or None)
+    if cmd == "rebuild": rebuild_diffs(codes)
+    elif cmd == "ensure":
+        for etf_code, days in ensure_diffs(codes or fund_codes()).items(): print(f"✅ [{etf_code}] 補算 {days} 天")
+    else: print(f"未知指令：{cmd} (可用 ensure / rebuild)")
@@ -0,0 +1,88 @@
+# ==========================================
+# 基金登錄表：爬蟲排程、HTTP 抓取、兩個儀表板都從這裡讀
+# 新增一檔 ETF = 在 FUNDS 加一筆設定，不用再複製一支爬蟲。
+#
+# 每筆欄位：
+#   code / label         代號、投信簡稱 (Discord 報告、分頁標題)
+#   name / short_name    app.py 與 etl.py 顯示的基金名稱
+#   url                  Selenium 要開的頁面
+#   http                 (選用) 免瀏覽器來源，格式見 fetchers.fetch_holdings；
+#                        verified=False 的網址還沒跟真實網站對照過，只有設定 ETF_HTTP_URL_<代號> 時才會用
+#                        (fixture 是依 data/*.csv 手寫的合成回應，不是錄製的)
+#                        identity 是回應裡必須出現的識別字 (另外也認 code / name)，避免把別檔基金的持股存進來；
+#                        只在 identity_xpath (HTML，預設 <title>) / identity_fields (JSON，預設 FundID 等) 找
+#   browser              Selenium 頁面操作：prepare = scraper.PREPARE_STEPS 的名稱，其餘為該步驟的參數
+#   extractor            持股表擷取方式：scraper.EXTRACTORS 的名稱
+#   min_rows             少於這個筆數視為抓取不完整，拒絕存檔 (沿用原本各爬蟲的門檻：只有復華要 15 筆，其他有表就存)；
+#                        http 裡的 min_rows 是 HTTP 結果的門檻，不夠就改用瀏覽器
+# ==========================================
+DEFAULT_MIN_ROWS = 1
+HTTP_MIN_ROWS = 15
+
+FUNDS = [
+    {
+        "code": "00981A",
+        "label": "統一",
+        "name": "統一台股增長主動式ETF",
+        "short_name": "主動統一台股增長",
+        "url": "https://www.ezmoney.com.tw/ETF/Transaction/PCF",
+        "http": {
+            "kind": "html",
+            "url": "https://www.ezmoney.com.tw/ETF/Transaction/PCF?fundCode=49YTW",
+            "verified": False,
+            "identity": ["49YTW"],
+            "identity_xpath": "//title | //select/option[@selected]",  # 目前選中的基金，不是整個選單
+            "fixture": "00981A_pcf.html",
+            "min_rows": HTTP_MIN_ROWS,
+        },
+        "browser": {"prepare": "select_option", "option_keywords": ["台股增長", "主動"]},
+        "extractor": "table",
+        "min_rows": DEFAULT_MIN_ROWS,
+    },
+    {
+        "code": "00991A",
+        "label": "復華",
+        "name": "復華未來50",
+        "short_name": "主動復華未來50",
+        "url": "https://www.fhtrust.com.tw/ETF/etf_detail/ETF23",
+        "browser": {
+            "prepare": "scroll_expand",
+            "ready_xpath": "//*[contains(text(),'證券代號') or contains(text(),'證券名稱')]",
+            "expand_xpath": "//*[contains(text(),'展開更多')]",
+        },
+        "extractor": "row_text",
+        "min_rows": 15,
+    },
+    {
+        "code": "00980A",
+        "label": "野村",
+        "name": "野村臺灣智慧優選",
+        "short_name": "主動野村臺灣優選",
+        "url": "https://www.nomurafunds.com.tw/ETFWEB/product-description?fundNo=00980A",
+        "http": {
+            "kind": "json",
+            "method": "POST",
+            "url": "https://www.nomurafunds.com.tw/API/ETFAPI/api/Fund/GetFundAssets",
+            "payload": {"FundID": "00980A"},
+            "verified": False,
+            "fixture": "00980A_assets.json",
+            "min_rows": HTTP_MIN_ROWS,
+        },
+        "browser": {
+            "prepare": "click_tabs",
+            "tab_xpath": "//*[contains(text(),'持股') or contains(text(),'成分')]",
+            "more_xpath": "//*[contains(text(),'查看更多') or contains(text(),'顯示全部')]",
+        },
+        "extractor": "table",
+        "min_rows": DEFAULT_MIN_ROWS,
+    },
+]
+
+FUND_MAP = {f["code"]: f for f in FUNDS}
+
+def get_fund(etf_code):
+    """代號 → 設定；不在登錄表裡回傳 None"""
+    return FUND_MAP.get(etf_code)
+
+def fund_codes():
+    return [f["code"] for f in FUNDS]
@@ -0,0 +1,73 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 精簡的持股歷史表示法 (常駐在 Streamlit worker 記憶體裡的版本)
+#   Date      → int32 日數 (1970-01-01 起算)
+#   股票代號/股票名稱 → category (每個字串只存一次)
+#   持有股數  → int64、權重 → float32
+# ==========================================
+HOLDING_COLUMNS = ['Date', '股票代號', '股票名稱', '持有股數', '權重']
+
+def to_day_numbers(dates):
+    days = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype('int64')
+    return days.astype('int32')
+
+def from_day_numbers(days):
+    return pd.to_datetime(np.asarray(days, dtype='int64'), unit='D')
+
+def first_per_day(df, date_col='Date'):
+    """同一天同一檔股票出現兩次時留第一筆；爬蟲 (validate_holdings)、etl、異動表、矩陣、生命週期都用這個規則，
+    同一份快照在每個面板的股數才會一樣"""
+    return df.drop_duplicates(subset=[date_col, '股票代號'], keep='first')
+
+def compact_holdings(df):
+    out = pd.DataFrame({
+        'Date': to_day_numbers(df['Date']),
+        '股票代號': df['股票代號'].astype(str).astype('category'),
+        '股票名稱': df['股票名稱'].astype(str).astype('category'),
+        '持有股數': pd.to_numeric(df['持有股數'], errors='coerce').fillna(0).astype('int64').to_numpy(),
+        '權重': pd.to_numeric(df['權重'], errors='coerce').fillna(0).astype('float32').to_numpy(),
+    }, index=df.index)
+    return out
+
+def is_compact(df, date_col='Date'):
+    return pd.api.types.is_integer_dtype(df[date_col])
+
+def expand_holdings(df, date_col='Date'):
+    """還原成一般欄位 (datetime / 字串)，給單日快照這種小表用"""
+    df = df.copy()
+    if is_compact(df, date_col): df[date_col] = from_day_numbers(df[date_col]).astype('datetime64[ns]')
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype): df[col] = df[col].astype(object)
+    return df
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+def memory_report(frames):
+    """frames: {代號: 原始 DataFrame}；回傳每檔原始 vs 精簡的記憶體用量"""
+    rows = []
+    for etf_code, df in frames.items():
+        if df is None or df.empty: continue
+        compact = compact_holdings(df)
+        before, after = frame_bytes(df), frame_bytes(compact)
+        rows.append({
+            'ETF': etf_code, '筆數': len(df), '天數': df['Date'].nunique(), '股票數': df['股票代號'].nunique(),
+            '原始 KB': before / 1024, '精簡 KB': after / 1024, '節省 %': (1 - after / before) * 100,
+        })
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    # python -m etfcore.holdings [代號...] → 以舊 dashboard 的讀法 (全部字串 + DateStr) 當基準
+    import glob, os
+    from .storage import csv_path, expand_refs
+    codes = sys.argv[1:] or [os.path.basename(p).split("_")[0] for p in sorted(glob.glob("data/*_history.csv"))]
+    frames = {}
+    for code in codes:
+        # 重複的日子存成 @日期 參照列，要先展開才是真正的持股筆數
+        df = expand_refs(pd.read_csv(csv_path(code), dtype=str, encoding='utf-8-sig'))
+        df['DateStr'] = df['Date']
+        frames[code] = df
+    print(memory_report(frames).to_string(index=False, float_format=lambda x: f"{x:,.1f}"))
@@ -0,0 +1,163 @@
+import os
+import csv
+import json
+import hashlib
+
+# ==========================================
+# 只用標準函式庫的部分 (不載入 pandas / numpy)：命令列的快速路徑 (etfcore/cli.py) 只 import 這裡
+#   歷史檔索引      → 每天的起始 byte、筆數、指紋、內容雜湊 (storage 的讀寫都靠它)
+#   異動表的位置與依據 → data/diffs 的檔名、sources.json、是否過期 (diffs 的計算在 etfcore/diffs.py)
+#   比對狀態標籤    → compare_snapshots 的 狀態 欄 (comparison 也從這裡拿)
+# ==========================================
+DATA_DIR = "data"
+
+# --- 歷史檔索引 ---
+INDEX_VERSION = 2
+REF_PREFIX = "@"  # 參照列的股票代號前綴
+HISTORY_COLUMNS = ['Date', '股票代號', '股票名稱', '持有股數', '權重']
+
+def csv_path(etf_code, data_dir=DATA_DIR):
+    return f"{data_dir}/{etf_code}_history.csv"
+
+def index_path(file_path):
+    return os.path.splitext(file_path)[0] + ".idx.json"
+
+def _to_float(val):
+    try: return float(val)
+    except (TypeError, ValueError): return 0.0
+
+def snapshot_fingerprint(codes, weights):
+    """代號 + 權重排序後的雜湊；兩天指紋相同 = 網站沒更新"""
+    items = sorted((str(c).strip(), _to_float(w)) for c, w in zip(codes, weights))
+    return hashlib.sha1("\n".join(f"{c},{w!r}" for c, w in items).encode("utf-8")).hexdigest()
+
+def snapshot_hash(codes, names, shares, weights):
+    """整份快照 (依原本順序、四個欄位都算) 的內容雜湊；相同 = 可以存成參照，展開後一模一樣"""
+    rows = (f"{str(c).strip()},{str(n).strip()},{_to_float(s)!r},{_to_float(w)!r}"
+            for c, n, s, w in zip(codes, names, shares, weights))
+    return hashlib.sha1("\n".join(rows).encode("utf-8")).hexdigest()
+
+def _index_contents(index):
+    """內容雜湊 → 第一次出現的實體日期 (參照日不算)；查重複 O(1)"""
+    contents = {}
+    for date in sorted(index["hashes"]):
+        if date not in index["refs"]: contents.setdefault(index["hashes"][date], date)
+    return contents
+
+def build_index(file_path):
+    """掃一次檔案 (不經過 pandas)，記下每天的起始 byte 位置、筆數、指紋與內容雜湊"""
+    index = {"version": INDEX_VERSION, "header": HISTORY_COLUMNS, "last_date": None,
+             "offsets": {}, "rows": {}, "fingerprints": {}, "hashes": {}, "refs": {}, "contents": {}, "size": 0}
+    if not os.path.exists(file_path): return index
+    snapshots = {}
+    with open(file_path, "rb") as f:
+        header_line = f.readline()
+        pos = len(header_line)
+        header = next(csv.reader([header_line.decode("utf-8-sig")]), [])
+        if header: index["header"] = header
+        cols = [header.index(c) for c in HISTORY_COLUMNS]
+        for line in f:
+            start, pos = pos, pos + len(line)
+            text = line.decode("utf-8").strip()
+            if not text: continue
+            row = next(csv.reader([text]))
+            if len(row) <= max(cols): continue
+            date, code, name, shares, weight = (row[i] for i in cols)
+            if date not in index["offsets"]:
+                index["offsets"][date] = start
+                snapshots[date] = ([], [], [], [])
+            if code.startswith(REF_PREFIX):
+                index["refs"][date] = code[len(REF_PREFIX):]
+                continue
+            for values, value in zip(snapshots[date], (code, name, shares, weight)): values.append(value)
+        index["size"] = pos
+    for date, (codes, names, shares, weights) in snapshots.items():
+        if date in index["refs"]: continue
+        index["rows"][date] = len(codes)
+        index["fingerprints"][date] = snapshot_fingerprint(codes, weights)
+        index["hashes"][date] = snapshot_hash(codes, names, shares, weights)
+    for date, src in index["refs"].items():
+        if src not in index["hashes"]: continue  # 來源不見了 (檔案被手動改過)：這天讀不到資料
+        for key in ("rows", "fingerprints", "hashes"): index[key][date] = index[key][src]
+    index["contents"] = _index_contents(index)
+    index["last_date"] = max(index["offsets"]) if index["offsets"] else None
+    return index
+
+def save_index(file_path, index):
+    path = index_path(file_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def load_index(file_path):
+    """讀索引；不存在、版本不符或跟檔案大小對不上 (被別人改過) 就重建"""
+    path = index_path(file_path)
+    size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION and index.get("size") == size:
+            return index
+    except (OSError, ValueError):
+        pass
+    index = build_index(file_path)
+    if os.path.exists(file_path): save_index(file_path, index)
+    return index
+
+def trading_dates(etf_code, data_dir=DATA_DIR):
+    """有資料的日期 (舊→新)，只讀索引"""
+    file_path = csv_path(etf_code, data_dir)
+    if not os.path.exists(file_path): return []
+    return sorted(load_index(file_path)["offsets"])
+
+# --- 異動表的位置與依據 ---
+DIFF_LAGS = (1, 5)  # 日變化 / 週變化
+
+def diff_dir(etf_code, data_dir=DATA_DIR):
+    return f"{data_dir}/diffs/{etf_code}"
+
+def diff_path(etf_code, date_str, data_dir=DATA_DIR):
+    return f"{diff_dir(etf_code, data_dir)}/{date_str}.csv"
+
+def sources_path(etf_code, data_dir=DATA_DIR):
+    return f"{diff_dir(etf_code, data_dir)}/sources.json"
+
+def diff_stamps(etf_code, data_dir=DATA_DIR, lags=DIFF_LAGS):
+    """{日期: 依據}；依據 = 當天與各 lag 基準日的 日期:內容雜湊，只讀 storage 索引"""
+    file_path = csv_path(etf_code, data_dir)
+    if not os.path.exists(file_path): return {}
+    index = load_index(file_path)
+    dates, hashes = sorted(index["offsets"]), index["hashes"]
+    stamps = {}
+    for i, date_str in enumerate(dates):
+        days = [date_str] + [dates[max(i - lag, 0)] for lag in lags]
+        stamps[date_str] = ",".join(f"{d}:{hashes.get(d, '')}" for d in days)
+    return stamps
+
+def load_sources(etf_code, data_dir=DATA_DIR):
+    try:
+        with open(sources_path(etf_code, data_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_sources(etf_code, sources, data_dir=DATA_DIR):
+    path = sources_path(etf_code, data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(sources, f, sort_keys=True)
+    os.replace(tmp, path)
+
+def is_fresh(etf_code, date_str, data_dir=DATA_DIR):
+    """這天的異動表存在，而且依據跟目前的歷史檔一致"""
+    if not os.path.exists(diff_path(etf_code, date_str, data_dir)): return False
+    stamp = diff_stamps(etf_code, data_dir).get(date_str)
+    return stamp is not None and load_sources(etf_code, data_dir).get(date_str) == stamp
+
+# --- 比對狀態 ---
+STATUS_NEW = '✨ 新進'
+STATUS_EXIT = '❌ 剔除'
+STATUS_ADD = '🔴 加碼'
+STATUS_CUT = '🟢 減碼'
+STATUS_FLAT = '⚪ 持平'
@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 題材分類：代號 → 題材 查表 (data/sector_map.csv)，查不到再看名稱
+#   名稱同時有「金」「銀」→ 💰 金融；有「電」→ 🔌 其他電子；其餘 📦 其他
+# 整批向量化，結果是 pandas Categorical (省記憶體、value_counts 快)
+# ==========================================
+SECTOR_MAP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sector_map.csv")
+FALLBACK_THEMES = ['💰 金融', '🔌 其他電子', '📦 其他']
+
+SECTOR_COLUMNS = ['股票代號', '題材']
+
+_SECTOR_CACHE = {}
+
+def load_sector_map(path=SECTOR_MAP_PATH):
+    """讀題材表 (股票代號,題材，欄位順序不拘)；檔案沒變就用上次讀好的；同一代號出現多次以最後一筆為準"""
+    try:
+        sig = os.stat(path).st_mtime_ns
+    except OSError:
+        return pd.Series(dtype=object)
+    cached = _SECTOR_CACHE.get(path)
+    if cached is not None and cached[0] == sig: return cached[1]
+    table = pd.read_csv(path, dtype=str, encoding="utf-8-sig")
+    table.columns = table.columns.str.strip()
+    missing = [c for c in SECTOR_COLUMNS if c not in table.columns]
+    if missing: raise ValueError(f"題材表 {path} 缺少欄位 {'、'.join(missing)} (表頭要有 {','.join(SECTOR_COLUMNS)})")
+    table = table[SECTOR_COLUMNS].dropna().assign(股票代號=lambda t: t['股票代號'].str.strip())
+    sector_map = table.drop_duplicates('股票代號', keep='last').set_index('股票代號')['題材']
+    _SECTOR_CACHE[path] = (sig, sector_map)
+    return sector_map
+
+def theme_categories(sector_map):
+    return list(dict.fromkeys(list(sector_map.values) + FALLBACK_THEMES))
+
+def classify_industry(codes, names, sector_map=None):
+    """codes/names 等長；回傳同順序的 Categorical"""
+    if sector_map is None: sector_map = load_sector_map()
+    codes = pd.Series(codes, dtype=object).astype(str).str.strip()
+    names = pd.Series(names, dtype=object).astype(str).str.strip()
+    themes = codes.map(sector_map)
+    is_fin = names.str.contains('金', regex=False) & names.str.contains('銀', regex=False)
+    is_elec = names.str.contains('電', regex=False)
+    fallback = np.select([is_fin, is_elec], FALLBACK_THEMES[:2], default=FALLBACK_THEMES[2])
+    themes = themes.where(themes.notna(), pd.Series(fallback, index=themes.index))
+    return pd.Categorical(themes, categories=theme_categories(sector_map))
+
+def industry_lookup(df, sector_map=None):
+    """每個代號分類一次 (用最新的名稱)，回傳 代號 → 題材 的 categorical Series，直接拿去 map"""
+    first = df.drop_duplicates('股票代號')
+    return pd.Series(classify_industry(first['股票代號'], first['股票名稱'], sector_map),
+                     index=first['股票代號'].astype(str).values)
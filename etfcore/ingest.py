@@ -0,0 +1,36 @@
+import pandas as pd
+from .storage import DATA_DIR, append_snapshot
+from .diffs import update_diffs
+from .consensus import update_matrix
+from .lifecycle import update_lifecycle
+from .tracing import span
+
+# ==========================================
+# 存檔入口：爬蟲 (update_data.save_to_csv) 拿到當天持股後只呼叫這裡
+#   1. 追加到歷史 CSV (storage：索引比對、重複資料不存)
+#   2. 當天的異動表 (diffs)
+#   3. 跨基金共識矩陣 (consensus)
+#   4. 持倉生命週期 (lifecycle，推一天)
+# ==========================================
+def save_snapshot(etf_code, new_df, date_str, data_dir=DATA_DIR):
+    """回傳寫入筆數 (0 = 沒存，例如跟上一筆一模一樣)"""
+    if isinstance(new_df, list): new_df = pd.DataFrame(new_df)
+
+    # 統一欄位型態
+    new_df['權重'] = pd.to_numeric(new_df['權重'], errors='coerce').fillna(0)
+    new_df['持有股數'] = pd.to_numeric(new_df['持有股數'], errors='coerce').fillna(0)
+
+    # 追加寫入 + 索引比對 (不再整檔讀回重寫)
+    with span("append_snapshot"): count = append_snapshot(etf_code, new_df, date_str, data_dir)
+    if count:
+        # 衍生資料跟著更新；失敗不影響已經存好的 CSV (異動表缺檔時儀表板現場比對，矩陣開啟時自己補算)
+        try:
+            with span("update_diffs"): update_diffs(etf_code, date_str, data_dir)
+        except Exception as e: print(f"⚠️ [{etf_code}] 異動表更新失敗: {e}")
+        try:
+            with span("update_matrix"): update_matrix(etf_code, date_str, new_df, data_dir)
+        except Exception as e: print(f"⚠️ [{etf_code}] 共識矩陣更新失敗: {e}")
+        try:
+            with span("update_lifecycle"): update_lifecycle(etf_code, date_str, new_df, data_dir)
+        except Exception as e: print(f"⚠️ [{etf_code}] 生命週期更新失敗: {e}")
+    return count
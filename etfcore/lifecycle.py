@@ -0,0 +1,267 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from .storage import DATA_DIR, csv_path, load_index
+from .consensus import HoldingsMatrix, ensure_matrix, matrix_path_for
+from .holdings import first_per_day
+
+# ==========================================
+# 持倉生命週期：每檔基金 × 每檔股票 的 進場日 / 出場日 / 連續加減碼 / 最高股數 / 持有天數
+#   data/lifecycle.npz    → 狀態本體 (股票 × 基金 的陣列，只記「截至最新一天」)
+#   data/lifecycle.json   → 每檔基金對應的 CSV 大小，用來判斷是否過期
+# 狀態一次只往前推一天 (step)：爬蟲存檔後推一步就好，不重播整份歷史；
+# 全部重算時從共識矩陣 (consensus.HoldingsMatrix) 一次算完：沿時間軸用累積運算 (最後一次進場 / 出場、
+# 之後的最高股數與連續加減碼)，不逐日迴圈。兩條路算出來的狀態相同。
+# 進場那天不算加碼：連續加減碼從進場後的第一次增減開始數。
+# ==========================================
+LIFECYCLE_FILE = "lifecycle.npz"
+LIFECYCLE_PATH = f"{DATA_DIR}/{LIFECYCLE_FILE}"
+LIFECYCLE_VERSION = 2  # 狀態的算法改了就加一，舊的狀態檔整份重算 (2：進場當天不算加碼)
+NAT = np.datetime64('NaT', 'D')
+
+def lifecycle_path_for(data_dir=DATA_DIR, path=None):
+    """狀態檔跟著資料目錄走 (同 consensus.matrix_path_for)"""
+    return path or os.path.join(data_dir, LIFECYCLE_FILE)
+
+def source_path(path=LIFECYCLE_PATH):
+    return os.path.splitext(path)[0] + ".json"
+
+class PositionLifecycle:
+    ARRAYS = ("shares", "peak", "streak", "entry", "exit")
+
+    def __init__(self, funds=()):
+        self.funds = list(funds)
+        self.codes = np.array([], dtype=str)
+        self.names = np.array([], dtype=str)
+        self.as_of = np.full(len(self.funds), NAT)                       # 每檔基金推到哪一天
+        shape = (0, len(self.funds))
+        self.shares = np.zeros(shape, dtype='int64')                    # 最新股數
+        self.peak = np.zeros(shape, dtype='int64')                      # 這段持有期間的最高股數
+        self.streak = np.zeros(shape, dtype='int32')                    # +n 連續加碼 n 次 / -n 連續減碼 (持平不中斷，進場歸 0)
+        self.entry = np.full(shape, NAT)                                # 這段持有期間的進場日
+        self.exit = np.full(shape, NAT)                                 # 最近一次出場日 (持有中為 NaT)
+        self._reindex()
+
+    def _reindex(self):
+        self._fund_pos = {f: i for i, f in enumerate(self.funds)}
+        self._code_pos = {c: i for i, c in enumerate(self.codes)}
+
+    @property
+    def nbytes(self):
+        return int(sum(getattr(self, key).nbytes for key in ("codes", "names", "as_of") + self.ARRAYS))
+
+    def fund_as_of(self, fund):
+        """這檔基金推到哪一天 ('YYYY-MM-DD')；沒有這檔或還沒推過回傳 None"""
+        fi = self._fund_pos.get(fund)
+        if fi is None or np.isnat(self.as_of[fi]): return None
+        return str(self.as_of[fi])
+
+    # --- 存讀 ---
+    @classmethod
+    def load(cls, path=LIFECYCLE_PATH):
+        if not os.path.exists(path): return cls()
+        with np.load(path, allow_pickle=False) as z:
+            lc = cls(list(z["funds"]))
+            for key in ("codes", "names", "as_of") + cls.ARRAYS: setattr(lc, key, z[key])
+        lc._reindex()
+        return lc
+
+    def save(self, path=LIFECYCLE_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, funds=np.array(self.funds, dtype=str), codes=self.codes, names=self.names, as_of=self.as_of,
+                 **{key: getattr(self, key) for key in self.ARRAYS})
+        os.replace(tmp, path)
+
+    # --- 擴充軸 ---
+    def _fund_index(self, fund):
+        fi = self._fund_pos.get(fund)
+        if fi is not None: return fi
+        self.funds.append(fund)
+        self.as_of = np.append(self.as_of, NAT)
+        for key in self.ARRAYS:
+            arr = getattr(self, key)
+            fill = NAT if arr.dtype.kind == 'M' else 0
+            setattr(self, key, np.concatenate([arr, np.full((len(arr), 1), fill, dtype=arr.dtype)], axis=1))
+        self._reindex()
+        return len(self.funds) - 1
+
+    def _code_indices(self, codes, names):
+        for code, name in zip(codes, names):
+            ci = self._code_pos.get(code)
+            if ci is None:
+                self._code_pos[code] = len(self.codes)
+                self.codes = np.append(self.codes, code)
+                self.names = np.append(self.names, name)
+            elif len(name) < len(self.names[ci]):
+                self.names[ci] = name
+        extra = len(self.codes) - len(self.shares)
+        if extra:
+            for key in self.ARRAYS:
+                arr = getattr(self, key)
+                fill = NAT if arr.dtype.kind == 'M' else 0
+                setattr(self, key, np.concatenate([arr, np.full((extra, len(self.funds)), fill, dtype=arr.dtype)]))
+        return np.array([self._code_pos[c] for c in codes], dtype='int64')
+
+    def reset(self, fi):
+        self.as_of[fi] = NAT
+        for key in self.ARRAYS:
+            arr = getattr(self, key)
+            arr[:, fi] = NAT if arr.dtype.kind == 'M' else 0
+
+    # --- 往前推一天 ---
+    def step(self, fi, date, new):
+        """基金 fi (位置或位置陣列) 在 date 的股數 new (股票 × 基金) 推進狀態；全部股票一次算完"""
+        date = np.datetime64(date, 'D')
+        old, streak = self.shares[:, fi], self.streak[:, fi]
+        delta = new - old
+        entered, exited = (old == 0) & (new > 0), (old > 0) & (new == 0)
+        self.streak[:, fi] = np.where(entered, 0,
+                                      np.where(delta > 0, np.where(streak > 0, streak + 1, 1),
+                                               np.where(delta < 0, np.where(streak < 0, streak - 1, -1), streak)))
+        self.peak[:, fi] = np.where(entered, new, np.maximum(self.peak[:, fi], new))
+        self.entry[:, fi] = np.where(entered, date, self.entry[:, fi])
+        self.exit[:, fi] = np.where(entered, NAT, np.where(exited, date, self.exit[:, fi]))
+        self.shares[:, fi] = new
+        self.as_of[fi] = date
+
+    def add_snapshot(self, fund, date_str, df):
+        """爬蟲存檔後的增量更新：只推一步 (df 是當天完整持股)"""
+        df = first_per_day(df.assign(Date=date_str))
+        fi = self._fund_index(fund)
+        ci = self._code_indices(df['股票代號'].astype(str).tolist(), df['股票名稱'].astype(str).tolist())
+        new = np.zeros(len(self.codes), dtype='int64')
+        new[ci] = pd.to_numeric(df['持有股數'], errors='coerce').fillna(0).to_numpy(dtype='int64')
+        self.step(fi, date_str, new)
+
+    # --- 從矩陣重算 ---
+    @classmethod
+    def from_matrix(cls, matrix, funds=None, until=None, base=None):
+        """從共識矩陣一次算出截至 until 的狀態 (跟逐日 step 的結果相同)。
+        每檔基金取它真的有快照的日子 (日期 × 股票)，沿時間軸用累積運算，不逐日迴圈。
+        base 給既有狀態時只重算 funds 這幾檔，其餘基金保留。"""
+        lc = cls() if base is None else base
+        funds = list(matrix.funds) if funds is None else [f for f in funds if f in matrix.funds]
+        rows = lc._code_indices(matrix.codes.tolist(), matrix.names.tolist())
+        stop = len(matrix.dates) if until is None else matrix.position(until) + 1
+        for fund in funds:
+            fi = lc._fund_index(fund)
+            lc.reset(fi)
+            days = np.flatnonzero(matrix.observed[:stop, matrix.funds.index(fund)])
+            if not len(days): continue
+            state = _replay(matrix.shares[days, :, matrix.funds.index(fund)], matrix.dates[days])
+            for key, value in zip(("shares", "peak", "streak", "entry", "exit"), state): getattr(lc, key)[rows, fi] = value
+            lc.as_of[fi] = matrix.dates[days[-1]]
+        return lc
+
+    # --- 查詢 ---
+    def table(self, fund, include_closed=True):
+        """某檔基金曾經持有過的每檔股票一列"""
+        fi = self._fund_pos.get(fund)
+        if fi is None or np.isnat(self.as_of[fi]): return pd.DataFrame()
+        held = self.shares[:, fi] > 0
+        keep = ~np.isnat(self.entry[:, fi]) & (held | include_closed)
+        end = np.where(held, self.as_of[fi], self.exit[:, fi])[keep]
+        entry = self.entry[keep, fi]
+        return pd.DataFrame({
+            '股票代號': self.codes[keep], '股票名稱': self.names[keep],
+            '持有中': held[keep], '持有股數': self.shares[keep, fi], '最高股數': self.peak[keep, fi],
+            '進場日': pd.DatetimeIndex(entry), '出場日': pd.DatetimeIndex(self.exit[keep, fi]),
+            '持有天數': (end - entry).astype('int64'), '連續加減碼': self.streak[keep, fi],
+        })
+
+def _replay(shares, dates):
+    """shares: 日期 × 股票 (只含有快照的日子，舊→新)；回傳最後一天的 (股數, 最高股數, 連續加減碼, 進場日, 出場日)。
+    規則同 PositionLifecycle.step，第一天之前視為沒有持股"""
+    k = np.arange(len(shares))[:, None]
+    prev = np.vstack([np.zeros((1, shares.shape[1]), dtype=shares.dtype), shares[:-1]])
+    delta = shares - prev
+    entered, exited = (prev == 0) & (shares > 0), (prev > 0) & (shares == 0)
+    last_entry = np.where(entered, k, -1).max(axis=0)
+    last_exit = np.where(exited, k, -1).max(axis=0)
+    since_entry = k > last_entry                             # 進場那天不算加碼
+    peak = np.where(k >= last_entry, shares, 0).max(axis=0)
+    # 連續加減碼 = 進場後最後一段同方向增減的次數 (持平不中斷)
+    sign = np.where(since_entry, np.sign(delta), 0)
+    last_move = np.where(sign != 0, k, -1).max(axis=0)
+    last_sign = sign[np.maximum(last_move, 0), np.arange(shares.shape[1])]
+    turn = np.where((sign != 0) & (sign != last_sign), k, -1).max(axis=0)
+    streak = (last_sign * ((sign != 0) & (k > turn)).sum(axis=0)).astype('int32')
+    entry = np.where(last_entry >= 0, dates[np.maximum(last_entry, 0)], NAT)
+    exit_ = np.where(last_exit > last_entry, dates[np.maximum(last_exit, 0)], NAT)
+    return shares[-1], peak, streak, entry, exit_
+
+# ==========================================
+# 增量維護 (ingest.save_snapshot 存檔後呼叫) 與過期補算，做法同 consensus
+# ==========================================
+_LOCK = threading.Lock()
+
+def _load_sources(path):
+    try:
+        with open(source_path(path), encoding="utf-8") as f:
+            sources = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return sources if sources.get("_version") == LIFECYCLE_VERSION else {}
+
+def _save(lc, sources, path):
+    sources["_version"] = LIFECYCLE_VERSION
+    lc.save(path)
+    tmp = source_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(sources, f)
+    os.replace(tmp, source_path(path))
+
+def _csv_size(etf_code, data_dir):
+    path = csv_path(etf_code, data_dir)
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+def _rebuild(lc, etf_codes, data_dir, matrix_path):
+    matrix_path = matrix_path_for(data_dir, matrix_path)
+    ensure_matrix(etf_codes, data_dir, matrix_path)
+    return PositionLifecycle.from_matrix(HoldingsMatrix.load(matrix_path), etf_codes, base=lc)
+
+def update_lifecycle(etf_code, date_str, df, data_dir=DATA_DIR, path=None, matrix_path=None):
+    """新快照推進狀態。狀態跟「存檔前的 CSV」同步、而且是往後推一天才增量，否則整檔基金重算。
+    path / matrix_path 沒給時放在 data_dir 底下"""
+    path = lifecycle_path_for(data_dir, path)
+    with _LOCK:
+        lc, sources = PositionLifecycle.load(path), _load_sources(path)
+        before = load_index(csv_path(etf_code, data_dir))["offsets"].get(date_str)
+        fi = lc._fund_pos.get(etf_code)
+        if (fi is not None and before is not None and sources.get(etf_code) == before
+                and lc.as_of[fi] < np.datetime64(date_str, 'D')):
+            lc.add_snapshot(etf_code, date_str, df)
+        else:
+            lc = _rebuild(lc, [etf_code], data_dir, matrix_path)
+        sources[etf_code] = _csv_size(etf_code, data_dir)
+        _save(lc, sources, path)
+
+def ensure_lifecycle(etf_codes, data_dir=DATA_DIR, path=None, matrix_path=None):
+    """確認狀態跟各基金 CSV 同步；過期的基金一起重算 (一趟)，回傳重算了哪些"""
+    path = lifecycle_path_for(data_dir, path)
+    sources = _load_sources(path)
+    fresh = os.path.exists(path)
+    stale = [c for c in etf_codes if not fresh or sources.get(c) != _csv_size(c, data_dir)]
+    if not stale: return []
+    with _LOCK:
+        lc, sources = PositionLifecycle.load(path), _load_sources(path)
+        lc = _rebuild(lc, stale, data_dir, matrix_path)
+        for etf_code in stale: sources[etf_code] = _csv_size(etf_code, data_dir)
+        _save(lc, sources, path)
+    return stale
+
+if __name__ == "__main__":
+    # python -m etfcore.lifecycle   → 全部重算並印出各基金持有最久的部位
+    import time
+    from .funds import fund_codes
+    for f in (LIFECYCLE_PATH, source_path()):
+        if os.path.exists(f): os.remove(f)
+    t0 = time.perf_counter()
+    ensure_lifecycle(fund_codes())
+    t1 = time.perf_counter()
+    lc = PositionLifecycle.load()
+    print(f"⏱️ 重算 {len(lc.funds)} 檔基金 × {len(lc.codes)} 檔股票：{(t1 - t0) * 1000:.0f} ms (含矩陣檢查)")
+    for fund in lc.funds:
+        table = lc.table(fund, include_closed=False).sort_values('持有天數', ascending=False)
+        print(f"📌 {fund}：持有 {len(table)} 檔，最久 " + "、".join(f"{r.股票名稱} {r.持有天數} 天" for r in table.head(3).itertuples()))
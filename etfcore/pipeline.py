@@ -0,0 +1,52 @@
+import pandas as pd
+from .storage import DATA_DIR, read_history
+from .snapshots import SnapshotIndex
+from .holdings import compact_holdings, first_per_day
+from .industry import industry_lookup
+from .tracing import span, traced
+
+# ==========================================
+# 兩個儀表板的資料流程 (不依賴 Streamlit，benchmark 直接呼叫)
+# ==========================================
+def load_snapshots(etf_code, data_dir=DATA_DIR):
+    """app.py 的載入：讀歷史 → 去掉「查看更多」等雜訊列 → 精簡表示 + 快照索引"""
+    # 型態轉換 (% / 千分位 / 數值) 由 storage 統一處理，CSV 或欄式後端皆可
+    with span("load_data", fund=etf_code):
+        df = read_history(etf_code, data_dir=data_dir)
+    if df is None: return None
+    with span("clean_data", fund=etf_code):
+        df = first_per_day(df[~df['股票名稱'].str.contains('查看更多|更多|Total', na=False)])
+        # 常駐記憶體的是精簡表示 (代號/名稱 category、日期 int32)；依日期 新→舊 每天一段連續切片
+        return SnapshotIndex(compact_holdings(df))
+
+@traced("clean_data")
+def clean_data(df):
+    """etl.py 的清洗 (會就地改 df 的欄位)"""
+    if df is None or df.empty: return pd.DataFrame()
+    for col in ['持有股數', '權重']:
+        if col not in df.columns: df[col] = '0'
+    for col in ['持有股數', '權重']:
+        if pd.api.types.is_numeric_dtype(df[col]): continue  # storage 已轉好型態
+        df[col] = df[col].astype(str).str.replace(',', '').str.replace('%', '')
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'])
+    else:
+        return pd.DataFrame()
+    df = first_per_day(df)
+    df = df.sort_values('Date', ascending=False)
+    return df
+
+def load_etl_snapshots(etf_code, data_dir=DATA_DIR):
+    """etl.py 的載入，每個資料版本只做一次：清洗 → 快照索引 → 題材分類 (題材表見 data/sector_map.csv)"""
+    try:
+        with span("load_data", fund=etf_code):
+            df = read_history(etf_code, data_dir=data_dir)
+    except Exception:
+        df = None
+    with span("clean_data", fund=etf_code):
+        df = clean_data(df)
+        if df.empty: return None
+        snaps = SnapshotIndex(compact_holdings(df))  # 日期字串由索引提供，不再另存 DateStr 欄
+        snaps.memo['industry'] = industry_lookup(snaps.frame)
+    return snaps
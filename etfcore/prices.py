@@ -0,0 +1,227 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from .storage import DATA_DIR, read_history
+
+# ==========================================
+# 本機收盤價庫：股數變化 × 收盤價 = 估計的資金流向 (新台幣)
+#   data/prices.csv → Date, 股票代號, 收盤價 (一列一檔一天，跟歷史檔一起進版控)
+#   data/prices_attempts.csv → 股票代號, Date：查過但沒有價格的代號 (下櫃、興櫃、債券等) 已經問到哪一天
+# 來源：yfinance (一次下載全部代號) / twstock (逐檔逐月，較慢)，或離線匯入別處下載的 CSV
+#   python -m etfcore.prices update [代號...]      → 補齊持股用到的代號
+#   python -m etfcore.prices import 檔案.csv        → 匯入 (長表或 日期 × 代號 寬表皆可)
+# 快照日遇到假日沒有收盤價時，往前取最近一個交易日 (最多 MAX_STALE_DAYS 天)。
+# ==========================================
+PRICE_PATH = f"{DATA_DIR}/prices.csv"
+PRICE_COLUMNS = ['Date', '股票代號', '收盤價']
+MAX_STALE_DAYS = 10
+DEFAULT_LOOKBACK_DAYS = 400  # 價格庫是空的時候往前抓多久
+
+# --- 存讀 ---
+def load_prices(path=PRICE_PATH):
+    """長表 DataFrame；檔案不存在回傳空表"""
+    if not os.path.exists(path):
+        return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), '股票代號': pd.Series(dtype=str),
+                             '收盤價': pd.Series(dtype='float64')})
+    df = pd.read_csv(path, dtype={'股票代號': str}, encoding="utf-8-sig")
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+def save_prices(new, path=PRICE_PATH):
+    """併入價格庫 (同一檔同一天以新的為準)，回傳寫入的筆數"""
+    new = new[PRICE_COLUMNS].dropna()
+    if new.empty: return 0
+    old = load_prices(path)
+    df = pd.concat([old, new], ignore_index=True)
+    df['Date'] = pd.to_datetime(df['Date']).astype('datetime64[ns]')
+    df = df.drop_duplicates(['Date', '股票代號'], keep='last')
+    df = df.sort_values(['Date', '股票代號'], kind='stable')
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    df.assign(Date=df['Date'].dt.strftime('%Y-%m-%d')).to_csv(tmp, index=False, encoding="utf-8-sig")
+    os.replace(tmp, path)
+    return len(new)
+
+def attempts_path(path=PRICE_PATH):
+    return path[:-len(".csv")] + "_attempts.csv"
+
+def load_attempts(path=PRICE_PATH):
+    """代號 → 最後一次查詢涵蓋到的日期 (那次沒有這檔的價格)"""
+    try:
+        df = pd.read_csv(attempts_path(path), dtype={'股票代號': str}, encoding="utf-8-sig")
+    except (OSError, ValueError):
+        return pd.Series(dtype='datetime64[ns]')
+    return pd.to_datetime(df.set_index('股票代號')['Date'])
+
+def save_attempts(attempts, path=PRICE_PATH):
+    df = attempts.sort_index().rename_axis('股票代號').rename('Date').reset_index()
+    tmp = attempts_path(path) + ".tmp"
+    df.assign(Date=df['Date'].dt.strftime('%Y-%m-%d')).to_csv(tmp, index=False, encoding="utf-8-sig")
+    os.replace(tmp, attempts_path(path))
+
+# --- 離線匯入 ---
+def _pick(columns, *keys):
+    for c in columns:
+        if any(k in str(c).lower() for k in keys): return c
+    return None
+
+def read_price_csv(src):
+    """別處下載的價格檔 → 長表。長表要有 日期 / 代號 / 收盤 三欄；寬表第一欄是日期、其餘欄名是代號"""
+    raw = pd.read_csv(src, dtype=str, encoding="utf-8-sig")
+    date_col = _pick(raw.columns, "date", "日期") or raw.columns[0]
+    code_col = _pick(raw.columns, "股票代號", "代號", "代碼", "code", "symbol", "ticker")
+    close_col = _pick(raw.columns, "收盤", "close")
+    if code_col is None or close_col is None:
+        raw = raw.melt(id_vars=[date_col], var_name='股票代號', value_name='收盤價')
+        code_col, close_col = '股票代號', '收盤價'
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(raw[date_col], errors='coerce'),
+        '股票代號': raw[code_col].astype(str).str.strip().str.replace(r'\.TWO?$', '', regex=True),
+        '收盤價': pd.to_numeric(raw[close_col].astype(str).str.replace(',', ''), errors='coerce'),
+    })
+    return df.dropna()
+
+def import_prices(src, path=PRICE_PATH):
+    n = save_prices(read_price_csv(src), path)
+    print(f"✅ 從 {src} 匯入 {n} 筆收盤價")
+    return n
+
+# --- 線上抓取 (選用套件，用到才 import) ---
+def _yahoo_symbol(code):
+    try:
+        import twstock
+        info = twstock.codes.get(code)
+        if info is not None and info.market == "上櫃": return f"{code}.TWO"
+    except ImportError:
+        pass
+    return f"{code}.TW"
+
+def fetch_yfinance(codes, start, end):
+    """所有代號一次下載 (yfinance 內部平行)，回傳長表"""
+    import yfinance as yf
+    symbols = {_yahoo_symbol(c): c for c in codes}
+    data = yf.download(list(symbols), start=start, end=end + pd.Timedelta(days=1), auto_adjust=False,
+                       progress=False, threads=True)
+    if data is None or data.empty: return pd.DataFrame(columns=PRICE_COLUMNS)
+    close = data["Close"] if isinstance(data.columns, pd.MultiIndex) else data[["Close"]].set_axis(list(symbols), axis=1)
+    df = close.rename(columns=symbols).rename_axis('Date').reset_index().melt(
+        id_vars='Date', var_name='股票代號', value_name='收盤價')
+    return df.dropna()
+
+def fetch_twstock(codes, start, end):
+    """逐檔逐月向證交所查詢 (沒有 yfinance 時的備案，會被限速)"""
+    import twstock
+    rows = []
+    for code in codes:
+        try:
+            stock = twstock.Stock(code, initial_fetch=False)
+            for d in stock.fetch_from(start.year, start.month):
+                if start <= pd.Timestamp(d.date) <= end: rows.append((pd.Timestamp(d.date), code, d.close))
+        except Exception as e:
+            print(f"⚠️ [{code}] twstock 查詢失敗: {e}")
+    return pd.DataFrame(rows, columns=PRICE_COLUMNS)
+
+FETCHERS = {"yfinance": fetch_yfinance, "twstock": fetch_twstock}
+
+def held_codes(etf_codes, data_dir=DATA_DIR):
+    """各基金歷史上持有過的代號 (4~6 碼數字，排除現金等雜項)"""
+    codes = set()
+    for etf_code in etf_codes:
+        df = read_history(etf_code, data_dir=data_dir)
+        if df is not None: codes.update(df['股票代號'].unique())
+    return sorted(c for c in codes if c.isdigit() and 4 <= len(c) <= 6)
+
+def update_prices(codes, end=None, source="yfinance", path=PRICE_PATH):
+    """每個代號從它在價格庫的最後一天 (沒有的話往前 DEFAULT_LOOKBACK_DAYS 天) 補到 end；
+    起點相同的代號合成一次請求 (平常全部同一天 → 一次)，查不到價格的代號不會拖著其他代號重抓整段。
+    回應裡沒有的代號記下這次問到哪天 (回應的最後一天，收盤價還沒出來的日子下次會再問)，下次從那天之後接著問"""
+    end = pd.Timestamp(end or pd.Timestamp.now().normalize())
+    last = load_prices(path).groupby('股票代號')['Date'].max()
+    attempts = load_attempts(path)
+    default_start = end - pd.Timedelta(days=DEFAULT_LOOKBACK_DAYS)
+    groups = {}
+    for code in codes:
+        known = [d for d in (last.get(code), attempts.get(code)) if d is not None and pd.notna(d)]
+        start = max(known) + pd.Timedelta(days=1) if known else default_start
+        if start <= end: groups.setdefault(start, []).append(code)
+    n, tried = 0, {}
+    for start, group in sorted(groups.items()):
+        df = FETCHERS[source](group, start, end)
+        written = save_prices(df, path)
+        print(f"💹 收盤價：{len(group)} 檔 {start.date()} ~ {end.date()}，寫入 {written} 筆 ({source})")
+        n += written
+        # 整包都沒資料可能是來源掛了或全是假日，不記，下次照樣問
+        if written:
+            covered = pd.Timestamp(pd.to_datetime(df['Date']).max())
+            tried.update({code: covered for code in set(group) - set(df['股票代號'])})
+    if tried:
+        print(f"💤 {len(tried)} 檔查不到價格，下次從 {max(tried.values()).date()} 之後再問")
+        save_attempts(pd.concat([attempts.drop(list(tried), errors='ignore'), pd.Series(tried, dtype='datetime64[ns]')]), path)
+    return n
+
+# ==========================================
+# 查價與資金流向 (向量化：任意 代號 × 日期 一次查完)
+# ==========================================
+class PriceMatrix:
+    def __init__(self, prices):
+        wide = prices.pivot_table(index='Date', columns='股票代號', values='收盤價', aggfunc='last') if len(prices) else pd.DataFrame()
+        wide = wide.sort_index()
+        self.dates = wide.index.to_numpy().astype('datetime64[D]')
+        self.codes = {c: i for i, c in enumerate(wide.columns)}
+        self.close = wide.ffill().to_numpy(dtype='float64')
+        # 每格對應的實際報價日，用來判斷往前沿用了多久
+        seen = np.where(wide.notna().to_numpy(), np.arange(len(wide))[:, None], -1)
+        self.quoted = np.maximum.accumulate(seen, axis=0) if len(wide) else seen
+
+    @property
+    def nbytes(self):
+        return int(self.close.nbytes + self.quoted.nbytes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def close_at(self, codes, dates):
+        """代號與日期可以是純量或陣列 (會 broadcast)；查不到或報價太舊回傳 NaN"""
+        codes, dates = np.broadcast_arrays(np.asarray(codes, dtype=object), np.asarray(dates, dtype='datetime64[D]'))
+        shape, codes, dates = codes.shape, codes.ravel(), dates.ravel()
+        out = np.full(len(codes), np.nan)
+        if self.codes:
+            ci = np.array([self.codes.get(c, -1) for c in codes], dtype='int64')
+            ti = np.searchsorted(self.dates, dates, side='right') - 1
+            ok = (ci >= 0) & (ti >= 0)
+            q = np.full(len(codes), -1)
+            q[ok] = self.quoted[ti[ok], ci[ok]]
+            ok &= q >= 0
+            ok[ok] &= (dates[ok] - self.dates[q[ok]]) <= np.timedelta64(MAX_STALE_DAYS, 'D')
+            out[ok] = self.close[ti[ok], ci[ok]]
+        return out.reshape(shape)[()]
+
+def estimate_flows(prices, codes, dates, share_deltas):
+    """估計資金流向 (元) = 股數增減 × 當天收盤價；沒價格的是 NaN"""
+    return np.asarray(share_deltas, dtype='float64') * prices.close_at(codes, dates)
+
+def add_flows(df, prices, date, columns):
+    """df 加上 收盤價 與 {股數欄: 金額欄} 的估計金額 (回傳新表)"""
+    close = prices.close_at(df['股票代號'].astype(str).to_numpy(), date)
+    out = df.assign(收盤價=close)
+    for shares_col, money_col in columns.items():
+        out[money_col] = out[shares_col].to_numpy(dtype='float64') * close
+    return out
+
+def has_flows(df, money_col):
+    return money_col in df.columns and df[money_col].notna().any()
+
+def format_twd(value):
+    """儀表板用的金額字串：+1.23 億 / -4,560 萬"""
+    if value is None or np.isnan(value): return "—"
+    if abs(value) >= 1e8: return f"{value / 1e8:+,.2f} 億"
+    return f"{value / 1e4:+,.0f} 萬"
+
+if __name__ == "__main__":
+    from .funds import fund_codes
+    cmd, args = (sys.argv[1] if len(sys.argv) > 1 else "update"), sys.argv[2:]
+    if cmd == "update": update_prices(args or held_codes(fund_codes()))
+    elif cmd == "import":
+        for src in args: import_prices(src)
+    else: print(f"未知指令：{cmd} (可用 update / import)")
@@ -0,0 +1,118 @@
+import io
+import os
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from .storage import DATA_DIR, csv_path, trading_dates, read_days
+from .comparison import compare_snapshots, STATUS_NEW, STATUS_EXIT, STATUS_ADD, STATUS_CUT, STATUS_FLAT
+from .diffs import read_diffs
+from .funds import get_fund
+
+# ==========================================
+# 批次報表：每檔基金某天對前 N 個交易日的異動 (與 get_comparison 同一套狀態)
+#   python -m etfcore report [代號...] [--format md|json|csv]
+# 優先讀預先算好的異動表 (data/diffs)；沒有的話只讀那兩天 (storage.read_days)，不載入整份歷史。
+# 多檔基金用多個行程平行處理，行程數受記憶體預算限制。
+# ==========================================
+MOVER_STATUSES = [STATUS_NEW, STATUS_EXIT, STATUS_ADD, STATUS_CUT]
+ALL_STATUSES = MOVER_STATUSES + [STATUS_FLAT]
+DEFAULT_TOP = 5
+DEFAULT_MEMORY_MB = int(os.environ.get("ETF_REPORT_MEMORY_MB", "1024"))
+WORKER_BASE_MB = 120  # 一個載入 pandas 的行程本身大約的記憶體
+CSV_BYTES_FACTOR = 20  # 兩天的 CSV 轉成 DataFrame + 比對後大約膨脹的倍數
+
+def _comparison(etf_code, date_str, base_str, data_dir):
+    stored = read_diffs(etf_code, date_str, data_dir)
+    if stored is not None:
+        rows = stored[stored['基準日'] == base_str]
+        if not rows.empty: return rows
+    df = read_days(etf_code, [date_str, base_str], data_dir)
+    df = df[~df['股票名稱'].str.contains('查看更多|更多|Total', na=False)].drop_duplicates(['Date', '股票代號'])
+    day = df['Date'].dt.strftime('%Y-%m-%d')
+    return compare_snapshots(df[day == date_str], df[day == base_str])
+
+def fund_report(etf_code, date_str=None, lag=1, top=DEFAULT_TOP, data_dir=DATA_DIR):
+    """單檔基金的摘要 dict；沒有資料或沒有這天回傳 None"""
+    dates = trading_dates(etf_code, data_dir)
+    if not dates: return None
+    date_str = date_str or dates[-1]
+    if date_str not in dates: return None
+    base_str = dates[max(dates.index(date_str) - lag, 0)]
+    merged = _comparison(etf_code, date_str, base_str, data_dir)
+
+    fund = get_fund(etf_code) or {}
+    counts = merged['狀態'].value_counts()
+    movers = {}
+    for status in MOVER_STATUSES:
+        group = merged[merged['狀態'] == status]
+        group = group.reindex(group['股數增減'].abs().sort_values(ascending=False, kind='stable').index).head(top)
+        movers[status] = [{
+            "code": str(r['股票代號']), "name": str(r['股票名稱']),
+            "shares": int(r['持有股數_今']), "shares_delta": int(r['股數增減']),
+            "weight": round(float(r['權重_今']), 4), "weight_delta": round(float(r['權重增減']), 4),
+        } for _, r in group.iterrows()]
+    return {
+        "etf": etf_code, "name": fund.get("name", etf_code), "label": fund.get("label", ""),
+        "date": date_str, "base_date": base_str, "lag": lag, "holdings": int((merged['持有股數_今'] > 0).sum()),
+        "counts": {status: int(counts.get(status, 0)) for status in ALL_STATUSES},
+        "movers": movers,
+    }
+
+def _report_job(args):
+    return fund_report(*args)
+
+def plan_workers(etf_codes, memory_mb=DEFAULT_MEMORY_MB, workers=None, data_dir=DATA_DIR):
+    """在記憶體預算內最多開幾個行程：每個行程 = 基本用量 + 最大那檔兩天資料的估計"""
+    day_bytes = 0
+    for etf_code in etf_codes:
+        path = csv_path(etf_code, data_dir)
+        n_days = max(len(trading_dates(etf_code, data_dir)), 1)
+        if os.path.exists(path): day_bytes = max(day_bytes, os.path.getsize(path) // n_days)
+    per_worker = WORKER_BASE_MB + 2 * day_bytes * CSV_BYTES_FACTOR / 2**20
+    limit = max(1, int(memory_mb // per_worker))
+    return max(1, min(workers or os.cpu_count() or 1, len(etf_codes), limit))
+
+def build_reports(etf_codes, date_str=None, lag=1, top=DEFAULT_TOP, workers=None,
+                  memory_mb=DEFAULT_MEMORY_MB, data_dir=DATA_DIR):
+    """依輸入順序回傳每檔的摘要 (沒資料的略過)"""
+    workers = plan_workers(etf_codes, memory_mb, workers, data_dir)
+    jobs = [(code, date_str, lag, top, data_dir) for code in etf_codes]
+    if workers == 1:
+        results = [_report_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_report_job, jobs))
+    return [r for r in results if r is not None]
+
+# --- 輸出格式 ---
+def to_markdown(reports, top=None):
+    """Discord / README 都能顯示的 Markdown；top 可以再縮短每類列出的檔數"""
+    lines = []
+    for r in reports:
+        title = f"{r['etf']} {r['label']}".strip()
+        lines.append(f"**{title}** ({r['date']} vs {r['base_date']}，持股 {r['holdings']} 檔)")
+        lines.append(" ｜ ".join(f"{s} {r['counts'][s]}" for s in MOVER_STATUSES))
+        for status in MOVER_STATUSES:
+            movers = r['movers'][status][:top] if top else r['movers'][status]
+            if not movers: continue
+            items = "、".join(f"{m['name']} {m['shares_delta']:+,}" for m in movers)
+            lines.append(f"- {status}：{items}")
+        lines.append("")
+    return "\n".join(lines).rstrip()
+
+def to_json(reports):
+    return json.dumps(reports, ensure_ascii=False, indent=2)
+
+CSV_FIELDS = ['etf', 'date', 'base_date', 'status', 'code', 'name', 'shares', 'shares_delta', 'weight', 'weight_delta']
+
+def to_csv(reports):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=CSV_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for r in reports:
+        for status in MOVER_STATUSES:
+            for m in r['movers'][status]:
+                writer.writerow({"etf": r['etf'], "date": r['date'], "base_date": r['base_date'], "status": status, **m})
+    return buf.getvalue()
+
+FORMATTERS = {"md": to_markdown, "json": to_json, "csv": to_csv}
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from .holdings import is_compact, expand_holdings, from_day_numbers
+
+# ==========================================
+# 每日快照索引：整份歷史依日期 (新→舊) 排好一次，
+# 每一天對應一段連續的列，取某天 / 前 N 個交易日都是 O(1) 切片。
+# 整份歷史可以是精簡表示 (holdings.compact_holdings)；取出的單日快照會還原成一般欄位。
+# ==========================================
+class SnapshotIndex:
+    def __init__(self, df, date_col='Date'):
+        frame = df.sort_values(date_col, ascending=False, kind='stable').reset_index(drop=True)
+        keys = frame[date_col].to_numpy()
+        if len(frame):
+            change = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+            self._starts = np.r_[0, change]
+            self._stops = np.r_[change, len(frame)]
+        else:
+            self._starts = self._stops = np.array([], dtype='int64')
+        self.frame = frame
+        self.date_col = date_col
+        self.compact = is_compact(frame, date_col)
+        self.dates = from_day_numbers(keys[self._starts]) if self.compact else pd.DatetimeIndex(keys[self._starts])  # 新 → 舊
+        self.date_strs = list(self.dates.strftime('%Y-%m-%d'))
+        self._pos = {d: i for i, d in enumerate(self.dates)}
+        self._pos.update({s: i for i, s in enumerate(self.date_strs)})
+        self.memo = {}  # 從這份快照衍生的結果 (趨勢線等)，跟著索引一起失效
+
+    def __len__(self):
+        return len(self.dates)
+
+    def position(self, date):
+        """日期 (Timestamp / date / 'YYYY-MM-DD') → 位置，0 是最新一天"""
+        pos = self._pos.get(date)
+        if pos is None: pos = self._pos[pd.Timestamp(date)]
+        return pos
+
+    def back(self, pos, n):
+        """往前 n 個交易日的位置，超出歷史就停在最舊的一天"""
+        return min(pos + n, len(self) - 1)
+
+    def at(self, pos):
+        snap = self.frame.iloc[self._starts[pos]:self._stops[pos]]
+        return expand_holdings(snap, self.date_col) if self.compact else snap
+
+    def get(self, date):
+        """某天的快照；沒有這天就回傳空表 (跟布林篩選的結果一致)"""
+        try: return self.at(self.position(date))
+        except KeyError:
+            empty = self.frame.iloc[0:0]
+            return expand_holdings(empty, self.date_col) if self.compact else empty
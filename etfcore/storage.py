@@ -0,0 +1,310 @@
+import io
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+from bisect import bisect_right
+import numpy as np
+import pandas as pd
+from .index import (DATA_DIR, REF_PREFIX, HISTORY_COLUMNS, csv_path, snapshot_fingerprint, snapshot_hash,
+                    _index_contents, build_index, save_index, load_index)
+from .index import index_path, trading_dates  # noqa: F401 (舊的匯入位置)
+
+# ==========================================
+# 歷史持股存檔：CSV 只追加不重寫，旁邊放一個小索引
+#   data/{etf}_history.csv        → 資料本體 (依日期遞增)
+#   data/{etf}_history.idx.json   → 每日的起始 byte、筆數、快照指紋、內容雜湊
+# 內容跟以前某一天完全相同的日子只寫一行參照 (股票代號 = "@來源日期")，讀取時展開成完整持股；
+# 舊檔用 `python -m etfcore.storage dedup` 轉換。索引本身 (建立、讀取、交易日曆) 在 etfcore/index.py，只用標準函式庫。
+# ==========================================
+# 另有欄式儲存 (Feather/Arrow IPC，依日期分區)，由 `python -m etfcore.storage migrate` 建立：
+#   data/columnar/{etf}/date=YYYY-MM-DD/part-0.arrow
+#   data/columnar/{etf}/_source.json   → 對應的 CSV 大小，用來判斷是否過期
+# ==========================================
+# 讀取後端："auto" (欄式存在且沒過期就用它，否則 CSV) / "csv" / "columnar"
+STORAGE_BACKEND = os.environ.get("ETF_STORAGE", "auto")
+
+def _drop_date(index, date):
+    for key in ("offsets", "rows", "fingerprints", "hashes", "refs"): index[key].pop(date, None)
+    index["contents"] = _index_contents(index)
+    index["last_date"] = max(index["offsets"]) if index["offsets"] else None
+
+# --- 寫入 ---
+def _rewrite_without(file_path, date):
+    # 罕見情況：要覆蓋的日期不在檔尾，只能整檔重寫一次
+    df = pd.read_csv(file_path, dtype=str, encoding="utf-8-sig")
+    # 有別天參照它的話，第一個參照日改存實體資料，其餘參照改指過去
+    dependents = sorted(df.loc[df['股票代號'] == REF_PREFIX + date, 'Date'])
+    if dependents:
+        first = dependents[0]
+        df.loc[df['股票代號'] == REF_PREFIX + date, '股票代號'] = REF_PREFIX + first
+        moved = df[df['Date'] == date].assign(Date=first)
+        df = pd.concat([df[df['Date'] != first], moved]).sort_values('Date', kind='stable')
+    df[df['Date'] != date].to_csv(file_path, index=False, encoding="utf-8-sig")
+    return build_index(file_path)
+
+def _ref_row(header, date_str, src):
+    row = dict.fromkeys(header, 0)
+    row.update({'Date': date_str, '股票代號': REF_PREFIX + src, '股票名稱': ""})
+    return pd.DataFrame([row], columns=header)
+
+def append_snapshot(etf_code, new_df, date_str, data_dir=DATA_DIR):
+    """把當天快照追加到歷史檔；跟上一筆一模一樣就不存，跟更早某天相同只寫參照。回傳當天筆數"""
+    file_path = csv_path(etf_code, data_dir)
+    new_df = new_df.copy()
+    if 'Date' in new_df.columns: new_df = new_df.drop(columns='Date')
+    new_df.insert(0, 'Date', date_str)
+    fingerprint = snapshot_fingerprint(new_df['股票代號'], new_df['權重'])
+    content_hash = snapshot_hash(new_df['股票代號'], new_df['股票名稱'], new_df['持有股數'], new_df['權重'])
+
+    if not os.path.exists(file_path):
+        new_df = new_df[HISTORY_COLUMNS]
+        new_df.to_csv(file_path, index=False, encoding="utf-8-sig")
+        index = build_index(file_path)
+    else:
+        index = load_index(file_path)
+        new_df = new_df.reindex(columns=index["header"], fill_value=0)
+
+        # 1. ★★★ 核心防呆：跟「上一筆資料」(今天以外最新的一天) 的指紋比對 ★★★
+        prev_dates = [d for d in index["offsets"] if d != date_str]
+        if prev_dates:
+            last_date = max(prev_dates)
+            if index["fingerprints"].get(last_date) == fingerprint:
+                print(f"⛔ [{etf_code}] 警告：抓到的資料與 {last_date} 完全一致！")
+                print("⛔ 判定網站尚未更新數據，本次 **不予存檔**。")
+                return 0
+
+        # 2. 今天已經存過 → 從當天的起點截斷再重寫
+        if date_str in index["offsets"]:
+            print(f"⚠️ [{etf_code}] 今天 ({date_str}) 已經有資料了，覆蓋更新...")
+            if date_str == index["last_date"]:
+                with open(file_path, "r+b") as f: f.truncate(index["offsets"][date_str])
+                _drop_date(index, date_str)
+            else:
+                index = _rewrite_without(file_path, date_str)
+
+        # 3. 內容跟以前某天完全相同 → 只寫一行參照
+        src = index["contents"].get(content_hash)
+        if src is not None:
+            print(f"♻️ [{etf_code}] 內容與 {src} 完全相同，只記錄參照")
+            index["refs"][date_str] = src
+
+        # 4. 追加 (不重讀舊資料)
+        buf = io.StringIO()
+        (new_df if src is None else _ref_row(index["header"], date_str, src)).to_csv(buf, index=False, header=False)
+        offset = os.path.getsize(file_path)
+        missing_newline = False
+        if offset > 0:
+            with open(file_path, "rb") as f:
+                f.seek(offset - 1)
+                missing_newline = f.read(1) != b"\n"
+        with open(file_path, "ab") as f:
+            if missing_newline:
+                f.write(b"\n")
+                offset += 1
+            f.write(buf.getvalue().encode("utf-8"))
+        index["offsets"][date_str] = offset
+        index["rows"][date_str] = len(new_df)
+        index["fingerprints"][date_str] = fingerprint
+        index["hashes"][date_str] = content_hash
+        if src is None: index["contents"].setdefault(content_hash, date_str)
+        index["last_date"] = max(index["offsets"])
+        index["size"] = os.path.getsize(file_path)
+
+    save_index(file_path, index)
+    if has_columnar(etf_code, data_dir):
+        write_partition(etf_code, date_str, new_df, data_dir)
+        _mark_columnar_source(etf_code, data_dir)
+    print(f"✅ [{etf_code}] 成功儲存 {len(new_df)} 筆資料！")
+    return len(new_df)
+
+# ==========================================
+# 讀取 API：兩個後端回傳同樣型態的 DataFrame
+#   Date datetime64 / 股票代號 str / 股票名稱 str / 持有股數 int64 / 權重 float32
+# ==========================================
+def to_typed(df):
+    df = df.copy()
+    for col in ('持有股數', '權重'):
+        if col not in df.columns: df[col] = 0
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(str).str.replace(',', '', regex=False).str.replace('%', '', regex=False).str.replace('--', '0', regex=False)
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['持有股數'] = df['持有股數'].astype('int64')
+    df['權重'] = df['權重'].astype('float32')
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce').astype('datetime64[ns]')
+    df = df[df['Date'].notna()]
+    for col in ('股票代號', '股票名稱'):
+        df[col] = df[col].astype(str).str.strip()
+    return df[HISTORY_COLUMNS].reset_index(drop=True)
+
+def expand_refs(df):
+    """把參照列換成來源日期的完整持股 (原始字串 DataFrame，to_typed 之前)"""
+    is_ref = df['股票代號'].astype(str).str.startswith(REF_PREFIX)
+    if not is_ref.any(): return df
+    refs, df = df[is_ref], df[~is_ref].reset_index(drop=True)
+    groups = df.groupby('Date', sort=False).indices
+    empty = np.empty(0, dtype=np.intp)
+    takes = [groups.get(code[len(REF_PREFIX):], empty) for code in refs['股票代號']]
+    out = df.iloc[np.concatenate([np.arange(len(df))] + takes)]
+    dates = np.concatenate([df['Date'].to_numpy(dtype=object)] +
+                           [np.full(len(t), d, dtype=object) for t, d in zip(takes, refs['Date'])])
+    return out.assign(Date=dates).sort_values('Date', kind='stable', ignore_index=True)
+
+def read_history_csv(etf_code, data_dir=DATA_DIR):
+    file_path = csv_path(etf_code, data_dir)
+    if not os.path.exists(file_path): return None
+    df = pd.read_csv(file_path, dtype=str, on_bad_lines='skip', encoding='utf-8-sig')
+    return to_typed(expand_refs(df))
+
+def read_days(etf_code, dates, data_dir=DATA_DIR):
+    """只讀某幾天：照索引的 byte 位置 seek 過去，不載入整份歷史 (批次報表用)"""
+    file_path = csv_path(etf_code, data_dir)
+    if not os.path.exists(file_path): return None
+    index = load_index(file_path)
+    bounds = sorted(index["offsets"].values()) + [index["size"]]
+    wanted = {date: index["refs"].get(date, date) for date in dates if date in index["offsets"]}
+    chunks = []
+    with open(file_path, "rb") as f:
+        for src in dict.fromkeys(wanted.values()):
+            start = index["offsets"].get(src)
+            if start is None: continue
+            f.seek(start)
+            chunk = f.read(bounds[bisect_right(bounds, start)] - start)
+            chunks.append(chunk if chunk.endswith(b"\n") else chunk + b"\n")
+    df = pd.read_csv(io.BytesIO(b"".join(chunks)), names=index["header"], header=None, dtype=str,
+                     on_bad_lines='skip', encoding="utf-8") if chunks else pd.DataFrame(columns=HISTORY_COLUMNS)
+    # 參照日：拿來源那天的資料改日期
+    parts = [df[df['Date'] == src].assign(Date=date) for date, src in wanted.items() if date != src]
+    if parts: df = pd.concat([df[df['Date'].isin([d for d, s in wanted.items() if d == s])]] + parts)
+    return to_typed(df)
+
+def columnar_dir(etf_code, data_dir=DATA_DIR):
+    return f"{data_dir}/columnar/{etf_code}"
+
+def _partition_path(etf_code, date_str, data_dir=DATA_DIR):
+    return f"{columnar_dir(etf_code, data_dir)}/date={date_str}/part-0.arrow"
+
+def has_columnar(etf_code, data_dir=DATA_DIR):
+    return os.path.isdir(columnar_dir(etf_code, data_dir))
+
+def _mark_columnar_source(etf_code, data_dir=DATA_DIR):
+    size = os.path.getsize(csv_path(etf_code, data_dir))
+    with open(f"{columnar_dir(etf_code, data_dir)}/_source.json", "w", encoding="utf-8") as f:
+        json.dump({"csv_size": size}, f)
+
+def columnar_fresh(etf_code, data_dir=DATA_DIR):
+    """欄式資料存在、pyarrow 可用、而且跟 CSV 同步 (CSV 被 git pull 更新過就算過期)"""
+    try:
+        import pyarrow  # noqa: F401
+        with open(f"{columnar_dir(etf_code, data_dir)}/_source.json", encoding="utf-8") as f:
+            marker = json.load(f)
+        return marker.get("csv_size") == os.path.getsize(csv_path(etf_code, data_dir))
+    except (ImportError, OSError, ValueError):
+        return False
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('Date', pa.date32()), ('股票代號', pa.string()), ('股票名稱', pa.string()),
+        ('持有股數', pa.int64()), ('權重', pa.float32()),
+    ])
+
+def write_partition(etf_code, date_str, df, data_dir=DATA_DIR):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    df = to_typed(df.assign(Date=date_str))
+    df['Date'] = df['Date'].dt.date
+    path = _partition_path(etf_code, date_str, data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 不壓縮 + memory map 讀取：每天一個小檔，開檔成本比解壓縮重要
+    table = pa.Table.from_pandas(df, schema=_arrow_schema(), preserve_index=False)
+    feather.write_feather(table, path, compression="uncompressed")
+
+def read_history_columnar(etf_code, data_dir=DATA_DIR):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    files = sorted(glob.glob(f"{columnar_dir(etf_code, data_dir)}/date=*/*.arrow"))
+    if not files: return None
+    table = pa.concat_tables([feather.read_table(f, memory_map=True) for f in files])
+    df = table.to_pandas(date_as_object=False)
+    df['Date'] = df['Date'].astype('datetime64[ns]')
+    return df
+
+def read_history(etf_code, backend=None, data_dir=DATA_DIR):
+    """兩個 dashboard 共用的讀取入口；檔案不存在回傳 None"""
+    backend = backend or STORAGE_BACKEND
+    if backend == "columnar" or (backend == "auto" and columnar_fresh(etf_code, data_dir)):
+        return read_history_columnar(etf_code, data_dir)
+    return read_history_csv(etf_code, data_dir)
+
+def migrate_to_columnar(etf_codes=None, data_dir=DATA_DIR):
+    """一次把 data/*.csv 轉成依日期分區的 Feather (會先清掉舊的欄式資料)"""
+    if etf_codes is None:
+        etf_codes = [os.path.basename(p).split("_")[0] for p in sorted(glob.glob(f"{data_dir}/*_history.csv"))]
+    for etf_code in etf_codes:
+        df = read_history_csv(etf_code, data_dir)
+        if df is None: continue
+        shutil.rmtree(columnar_dir(etf_code, data_dir), ignore_errors=True)
+        for date, part in df.groupby(df['Date'].dt.strftime('%Y-%m-%d'), sort=True):
+            write_partition(etf_code, date, part, data_dir)
+        _mark_columnar_source(etf_code, data_dir)
+        print(f"✅ [{etf_code}] 轉檔完成：{df['Date'].nunique()} 天 / {len(df)} 筆")
+    return etf_codes
+
+def dedup_history(etf_codes=None, data_dir=DATA_DIR):
+    """把舊檔裡跟以前某天完全相同的日子改成參照列 (整檔重寫一次)，回傳 {代號: 轉成參照的天數}"""
+    if etf_codes is None:
+        etf_codes = [os.path.basename(p).split("_")[0] for p in sorted(glob.glob(f"{data_dir}/*_history.csv"))]
+    results = {}
+    for etf_code in etf_codes:
+        file_path = csv_path(etf_code, data_dir)
+        if not os.path.exists(file_path): continue
+        df = expand_refs(pd.read_csv(file_path, dtype=str, on_bad_lines='skip', encoding='utf-8-sig'))
+        before = os.path.getsize(file_path)
+        seen, parts, n_refs = {}, [], 0
+        for date, day in df.groupby('Date', sort=False):
+            h = snapshot_hash(day['股票代號'], day['股票名稱'], day['持有股數'], day['權重'])
+            if h in seen:
+                parts.append(_ref_row(list(df.columns), date, seen[h]))
+                n_refs += 1
+            else:
+                seen[h] = date
+                parts.append(day)
+        tmp = file_path + ".tmp"
+        pd.concat(parts, ignore_index=True).to_csv(tmp, index=False, encoding="utf-8-sig")
+        os.replace(tmp, file_path)
+        save_index(file_path, build_index(file_path))
+        results[etf_code] = n_refs
+        print(f"✅ [{etf_code}] {n_refs} 天改成參照：{before / 1024:,.0f} KB → {os.path.getsize(file_path) / 1024:,.0f} KB")
+    return results
+
+def bench_backends(etf_codes=None, repeat=5, data_dir=DATA_DIR):
+    """CSV 與欄式讀取並排計時 (取最快一次)"""
+    if etf_codes is None:
+        etf_codes = [os.path.basename(p).split("_")[0] for p in sorted(glob.glob(f"{data_dir}/*_history.csv"))]
+    results = {}
+    for etf_code in etf_codes:
+        row = {}
+        for name, reader in (("csv", read_history_csv), ("columnar", read_history_columnar)):
+            if name == "columnar" and not has_columnar(etf_code, data_dir): continue
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                reader(etf_code, data_dir)
+                best = min(best, time.perf_counter() - t0)
+            row[name] = best
+        results[etf_code] = row
+        print(f"⏱️ [{etf_code}] " + " / ".join(f"{k} {v * 1000:.1f} ms" for k, v in row.items()))
+    return results
+
+if __name__ == "__main__":
+    # python -m etfcore.storage migrate [代號...]   → CSV 轉欄式
+    # python -m etfcore.storage bench [代號...]     → 兩種後端讀取速度比較
+    # python -m etfcore.storage dedup [代號...]     → 重複的日子改存參照
+    cmd, codes = (sys.argv[1] if len(sys.argv) > 1 else "bench"), (sys.argv[2:] or None)
+    if cmd == "migrate": migrate_to_columnar(codes)
+    elif cmd == "bench": bench_backends(codes)
+    elif cmd == "dedup": dedup_history(codes)
+    else: print(f"未知指令：{cmd} (可用 migrate / bench / dedup)")
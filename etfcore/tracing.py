@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import functools
+import contextvars
+from collections import deque
+from .storage import DATA_DIR
+
+# ==========================================
+# 輕量追蹤：爬蟲與儀表板各步驟的耗時 (span)，一行一筆寫進 JSON Lines
+#   ETF_TRACE=1 python update_data.py           → 寫到 data/trace.jsonl
+#   ETF_TRACE=/tmp/t.jsonl streamlit run app.py  → 寫到指定檔案 (整個行程都記錄)
+#   set_session(True)                            → 只有目前這個 context 記錄 (app 的效能面板，一個 session 一份)
+#   python -m etfcore.tracing [update|render]    → 印出最近一次的各基金耗時
+# 沒開的時候 span() 回傳同一個空物件，不取時間、不配置記憶體。
+# 一次「執行」(一輪更新、一次畫面重跑) 是一個 trace；底下的 span 用 contextvars 串成樹，
+# fund 欄位會往下傳，子步驟 (開瀏覽器、載入頁面...) 不用自己帶代號。
+# ==========================================
+TRACE_ENV = "ETF_TRACE"
+TRACE_PATH = f"{DATA_DIR}/trace.jsonl"
+MAX_BYTES = int(os.environ.get("ETF_TRACE_MAX_MB", "5")) * 2**20  # 超過就換成 .1 檔，只留一份舊的
+INHERITED = ("fund",)
+RECENT = deque(maxlen=2000)  # 本行程最近完成的 span (app 的效能面板直接讀，不用回頭讀檔)
+
+_state = {"enabled": False, "path": TRACE_PATH, "from_env": False}
+_current = contextvars.ContextVar("etf_trace_span", default=None)  # (trace id, span id, 往下傳的欄位)
+_session = contextvars.ContextVar("etf_trace_session", default=False)  # 只在這個 context 打開
+_write_lock = threading.Lock()
+
+class _NoopSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, **attrs): pass
+    def start(self): return self
+    def finish(self): pass
+    def elapsed_ms(self): return 0.0
+
+NOOP = _NoopSpan()
+
+class Span:
+    __slots__ = ("name", "attrs", "root", "trace", "id", "parent", "ts", "_t0", "_token")
+
+    def __init__(self, name, attrs, root=False):
+        self.name, self.attrs, self.root = name, attrs, root
+
+    def __enter__(self):
+        parent = None if self.root else _current.get()
+        self.trace = parent[0] if parent else uuid.uuid4().hex[:12]
+        self.parent = parent[1] if parent else None
+        self.id = uuid.uuid4().hex[:8]
+        inherited = dict(parent[2]) if parent else {}
+        inherited.update((k, self.attrs[k]) for k in INHERITED if k in self.attrs)
+        self.attrs = {**inherited, **self.attrs}
+        self._token = _current.set((self.trace, self.id, inherited))
+        self.ts = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self._t0) * 1000
+        try: _current.reset(self._token)
+        except ValueError: _current.set(None)  # 在別的 context 結束 (Streamlit 中途 st.stop)
+        record = {"ts": round(self.ts, 3), "trace": self.trace, "span": self.id, "parent": self.parent,
+                  "name": self.name, "ms": round(ms, 3), "pid": os.getpid(), **self.attrs}
+        if exc_type is not None: record["error"] = exc_type.__name__
+        _emit(record)
+        return False
+
+    def set(self, **attrs):
+        """執行中補欄位 (例如存了幾筆)"""
+        self.attrs.update(attrs)
+
+    # 沒辦法整段包在 with 裡的地方 (Streamlit 腳本從頭跑到尾) 用 start / finish
+    def start(self): return self.__enter__()
+    def finish(self): self.__exit__(None, None, None)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._t0) * 1000
+
+def span(name, **attrs):
+    if not (_state["enabled"] or _session.get()): return NOOP
+    return Span(name, attrs)
+
+def trace(kind, **attrs):
+    """開一個新的 trace (不掛在目前的 span 底下)；kind 之後用來找「最近一次更新 / 畫面」"""
+    if not (_state["enabled"] or _session.get()): return NOOP
+    return Span(kind, {**attrs, "kind": kind}, root=True)
+
+def traced(name=None):
+    """裝飾器版本；開關在呼叫時才檢查，執行中打開也有效"""
+    def decorate(func):
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (_state["enabled"] or _session.get()): return func(*args, **kwargs)
+            with Span(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# --- 開關 ---
+def enable(path=None):
+    """整個行程打開 (命令列 / ETF_TRACE)，並設定環境變數讓子行程也記錄到同一個檔案"""
+    _state.update(enabled=True, path=path or _state["path"])
+    os.environ[TRACE_ENV] = _state["path"]
+
+def disable():
+    _state["enabled"] = False
+    os.environ.pop(TRACE_ENV, None)
+
+def enabled():
+    """目前這個 context 會不會記錄 (整個行程打開，或這個 session 打開)"""
+    return _state["enabled"] or _session.get()
+
+def enabled_by_env():
+    """由環境變數在啟動時打開的"""
+    return _state["from_env"]
+
+def set_session(on):
+    """只影響目前的 context：Streamlit 每個 session 的重跑在自己的執行緒，互不干擾；
+    不改行程狀態，也不動環境變數"""
+    _session.set(bool(on))
+
+def subprocess_env():
+    """目前 context 有記錄時，讓子行程 (背景更新) 記錄到同一個檔案的環境變數"""
+    return {TRACE_ENV: _state["path"]} if enabled() else {}
+
+def trace_path():
+    return _state["path"]
+
+def _init_from_env():
+    value = os.environ.get(TRACE_ENV, "").strip()
+    if value.lower() in ("", "0", "false", "off"): return
+    enable(None if value.lower() in ("1", "true", "on") else value)
+    _state["from_env"] = True
+
+_init_from_env()
+
+# --- 輸出 ---
+def _emit(record):
+    RECENT.append(record)
+    path = _state["path"]
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    try:
+        with _write_lock:
+            if os.path.exists(path) and os.path.getsize(path) > MAX_BYTES: os.replace(path, path + ".1")
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f: f.write(line)
+    except OSError:
+        pass  # 記錄失敗不影響主流程
+
+def read_spans(path=None, tail_bytes=2**20):
+    """讀檔案最後 tail_bytes 的 span (舊→新)；壞掉的行略過"""
+    path = path or _state["path"]
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - tail_bytes))
+            data = f.read()
+    except OSError:
+        return []
+    lines = data.decode("utf-8", errors="ignore").splitlines()
+    if size > tail_bytes: lines = lines[1:]  # 第一行可能被切一半
+    spans = []
+    for line in lines:
+        try: spans.append(json.loads(line))
+        except ValueError: pass
+    return spans
+
+# --- 彙整 ---
+def last_trace(spans, kind):
+    """最近一次完成的 kind 執行 → (根 span, 底下所有 span)；沒有回傳 (None, [])"""
+    root = next((s for s in reversed(spans) if s.get("kind") == kind and s.get("parent") is None), None)
+    if root is None: return None, []
+    return root, [s for s in spans if s["trace"] == root["trace"] and s is not root]
+
+def trace_spans(trace_id, spans=None):
+    """某個 trace 目前已經完成的 span (預設從本行程的 RECENT 找)"""
+    return [s for s in (RECENT if spans is None else spans) if s["trace"] == trace_id]
+
+def breakdown(spans, key="fund"):
+    """{key 的值: {步驟: 合計毫秒}}；同名的巢狀 span 只算最外層，避免重複計時"""
+    by_id = {s["span"]: s for s in spans}
+    out = {}
+    for s in spans:
+        parent = by_id.get(s.get("parent"))
+        nested = False
+        while parent is not None:
+            if parent["name"] == s["name"]: nested = True; break
+            parent = by_id.get(parent.get("parent"))
+        if nested: continue
+        steps = out.setdefault(s.get(key) or "-", {})
+        steps[s["name"]] = round(steps.get(s["name"], 0.0) + s["ms"], 3)
+    return out
+
+if __name__ == "__main__":
+    # python -m etfcore.tracing [update|render] [檔案]
+    kind = sys.argv[1] if len(sys.argv) > 1 else "update"
+    root, spans = last_trace(read_spans(sys.argv[2] if len(sys.argv) > 2 else None), kind)
+    if root is None: raise SystemExit(f"ℹ️ 沒有 {kind} 的紀錄 (執行時設定 {TRACE_ENV}=1)")
+    print(f"⏱️ {kind} @ {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(root['ts']))}：{root['ms'] / 1000:.1f} 秒")
+    for group, steps in sorted(breakdown(spans).items()):
+        print(f"  {group}: " + " / ".join(f"{k} {v:,.0f} ms" for k, v in sorted(steps.items(), key=lambda kv: -kv[1])))
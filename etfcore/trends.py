@@ -0,0 +1,34 @@
+import numpy as np
+from .tracing import traced
+
+# ==========================================
+# 批次趨勢線：一次 pivot (日期 × 代號) 算出整張表的 sparkline
+# ==========================================
+TREND_WINDOWS = (30, 60, 120)
+TREND_FALLBACK = [0.0, 0.0]  # 沒資料或全為 0 時畫一條平線
+
+@traced("trend_build")
+def build_trends(snaps, pos, window=30, value_col='權重'):
+    """回傳 {代號: 近 window 個交易日 (截至第 pos 天) 的數值}；沒持有的日子略過"""
+    last = snaps.back(pos, window - 1)
+    # 快照依日期 新→舊 排好，window 天剛好是一段連續的列
+    start, stop = snaps._starts[pos], snaps._stops[last]
+    sub = snaps.frame.iloc[start:stop]
+    if sub.empty: return {}
+    pivot = sub.pivot_table(index=snaps.date_col, columns='股票代號', values=value_col, aggfunc='first',
+                            observed=True).sort_index()
+    trends = {}
+    for code, values in zip(pivot.columns, pivot.to_numpy(dtype='float64').T):
+        values = values[~np.isnan(values)].round(6)  # 去掉 float32 轉 float64 的尾數
+        trends[code] = values.tolist() if values.any() else list(TREND_FALLBACK)
+    return trends
+
+def get_trends(snaps, pos, window=30, value_col='權重'):
+    """同一份快照索引 + 同一個基準日只算一次"""
+    key = ("trends", snaps.dates[pos], window, value_col)
+    if key not in snaps.memo:
+        snaps.memo[key] = build_trends(snaps, pos, window, value_col)
+    return snaps.memo[key]
+
+def trend_column(trends, codes):
+    return [trends.get(code, list(TREND_FALLBACK)) for code in codes]
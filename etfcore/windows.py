@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from .comparison import comparison_status
+from .tracing import span
+
+# ==========================================
+# 任意回看區間：單一基金的 日期 × 股票 矩陣 (股數 / 權重 / 名稱)
+# 快照索引 (SnapshotIndex) 排好後一次鋪成矩陣，記在 snaps.memo，跟著資料版本一起失效；
+# 之後任何區間 (1 / 5 / 20 / 60 日、自訂基準日) 都只是兩列相減，不再逐次 outer merge。
+# 欄位順序 = 代號排序，跟 compare_snapshots (pandas outer merge 會排序鍵) 的列順序一致。
+# ==========================================
+WINDOW_CHOICES = (1, 5, 20, 60)
+DEFAULT_WINDOW = 5
+
+class ShareMatrix:
+    def __init__(self, snaps):
+        frame = snaps.frame
+        codes = pd.Categorical(frame['股票代號'].astype(str) if not snaps.compact else frame['股票代號'])
+        names = pd.Categorical(frame['股票名稱'].astype(str) if not snaps.compact else frame['股票名稱'])
+        self.codes = np.asarray(codes.categories, dtype=object)
+        self.names = np.asarray(names.categories, dtype=object)
+        shape = (len(snaps), len(self.codes))
+        self.shares = np.zeros(shape, dtype='int64')
+        self.weight = np.zeros(shape, dtype='float64')
+        self.name_id = np.full(shape, -1, dtype='int32')  # -1 = 這天快照裡沒有這檔
+        # 依日期 新→舊 每天一段連續列；同一天重複的代號以第一筆為準 (倒著寫，前面的蓋過後面的)
+        rows = np.repeat(np.arange(len(snaps)), snaps._stops - snaps._starts)[::-1]
+        cols = codes.codes[::-1]
+        self.shares[rows, cols] = frame['持有股數'].to_numpy(dtype='int64')[::-1]
+        self.weight[rows, cols] = frame['權重'].to_numpy(dtype='float64')[::-1]
+        self.name_id[rows, cols] = names.codes[::-1]
+
+    @property
+    def nbytes(self):
+        return int(self.shares.nbytes + self.weight.nbytes + self.name_id.nbytes)
+
+    def net_change(self, pos, base_pos):
+        """第 pos 天對第 base_pos 天的股數增減 (所有股票一次相減)"""
+        return self.shares[pos] - self.shares[base_pos]
+
+    def changes(self, pos, prev_pos, base_pos):
+        """etl.py 的主表：日變化 (對 prev_pos) + 區間變化 (對 base_pos)，一列一檔
+        (三天任一天的快照裡有的股票)；只出現在區間基準日的股票 (已剔除) 今日股數為 0。"""
+        present = self.name_id[[pos, prev_pos, base_pos]] >= 0
+        keep = present.any(axis=0)
+        # 名稱以觀察日為準，沒有的話依序往 日比較 → 區間基準 找
+        ids = self.name_id[[pos, prev_pos, base_pos]][:, keep]
+        first = np.argmax(ids >= 0, axis=0)
+        now, prev, base = self.shares[pos, keep], self.shares[prev_pos, keep], self.shares[base_pos, keep]
+        return pd.DataFrame({
+            '股票代號': self.codes[keep],
+            '股票名稱': self.names[ids[first, np.arange(ids.shape[1])]],
+            '持有股數': now.astype('float64'),
+            '權重': self.weight[pos, keep],
+            '持有股數_old': prev.astype('float64'),
+            '股數變化_日': (now - prev).astype('float64'),
+            # 只出現在區間基準日的股票 (已剔除) 沒有日比較，狀態留空
+            '狀態_日': np.where(present[:2, keep].any(axis=0), comparison_status(now, prev), None),
+            '持有股數_base': base.astype('float64'),
+            '股數變化_區間': (now - base).astype('float64'),
+        })
+
+def get_share_matrix(snaps):
+    """同一份快照索引只鋪一次矩陣"""
+    if "share_matrix" not in snaps.memo:
+        with span("matrix_build", days=len(snaps)):
+            snaps.memo["share_matrix"] = ShareMatrix(snaps)
+    return snaps.memo["share_matrix"]
+
+def window_changes(snaps, pos, window, prev_window=1):
+    """觀察日 pos 的日變化 + 區間變化；window 是往前幾個交易日 (超出歷史停在最舊一天)"""
+    matrix = get_share_matrix(snaps)
+    with span("comparison", source="matrix", window=window):
+        return matrix.changes(pos, snaps.back(pos, prev_window), snaps.back(pos, window))
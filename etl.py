@@ -1,8 +1,19 @@
 import streamlit as st
 import pandas as pd
-import os
 import plotly.express as px
 import plotly.graph_objects as go
+from etfcore.storage import csv_path
+from etfcore.cache import FrameCache, file_signature
+from etfcore.industry import SECTOR_MAP_PATH
+from etfcore.funds import FUNDS, fund_codes
+from etfcore.trends import TREND_WINDOWS, get_trends, trend_column
+from etfcore.pipeline import load_etl_snapshots
+from etfcore.windows import WINDOW_CHOICES, DEFAULT_WINDOW, window_changes
+from etfcore.comparison import STATUS_NEW, STATUS_EXIT, STATUS_ADD, STATUS_CUT, STATUS_FLAT
+from etfcore.consensus import MATRIX_PATH, HoldingsMatrix, ensure_matrix
+from etfcore.lifecycle import LIFECYCLE_PATH, PositionLifecycle, ensure_lifecycle
+from etfcore.prices import PRICE_PATH, PriceMatrix, load_prices, add_flows, has_flows, format_twd
+from etfcore.tracing import span, trace
 
 st.set_page_config(page_title="ETF 戰情室 5.1", page_icon="🚀", layout="wide")
 
@@ -23,117 +34,36 @@ st.markdown("""
 st.title("🚀 2026 主動式 ETF 經理人操盤追蹤 (題材細分版)")
 
 # --- 資料讀取與修復 ---
-@st.cache_data(ttl=60)
-def load_data(file_path):
-    if not os.path.exists(file_path):
-        return None
-    try:
-        return pd.read_csv(file_path, dtype=str, on_bad_lines='skip', engine='python', encoding='utf-8-sig')
-    except:
-        return None
+# 整個行程共用：檔案內容沒變就不重讀、不重洗；超過記憶體上限淘汰最久沒看的 ETF
+@st.cache_resource
+def get_frame_cache():
+    return FrameCache()
 
-def clean_data(df):
-    if df is None or df.empty: return pd.DataFrame()
-    for col in ['持有股數', '權重']:
-        if col not in df.columns: df[col] = '0'
-    for col in ['持有股數', '權重']:
-        df[col] = df[col].astype(str).str.replace(',', '').str.replace('%', '')
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-    if 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'])
-        df['DateStr'] = df['Date'].dt.strftime('%Y-%m-%d')
-    else:
-        return pd.DataFrame()
-    df = df.drop_duplicates(subset=['DateStr', '股票代號'], keep='first')
-    df = df.sort_values('Date', ascending=False)
-    return df
+def load_data(etf_code):
+    # 題材表改了也要重算分類，所以把它的版本一起放進 key
+    return get_frame_cache().get(csv_path(etf_code), lambda: load_etl_snapshots(etf_code),
+                                 tag=file_signature(SECTOR_MAP_PATH))
 
-# --- 核心邏輯：計算趨勢線數據 ---
-def get_trend_data(full_df, stock_code):
-    try:
-        history = full_df[full_df['股票代號'] == stock_code].sort_values('Date', ascending=True)
-        data = history['權重'].tail(30).tolist()
-        if not data: return [0.0, 0.0]
-        if all(x == 0 for x in data): return [0.0, 0.0]
-        return data
-    except:
-        return [0.0, 0.0]
+def load_price_matrix():
+    return get_frame_cache().get(PRICE_PATH, lambda: PriceMatrix(load_prices()))
 
-# --- ★★★ 究極細分：台股熱門題材字典 ★★★ ---
-STOCK_SECTOR_MAP = {
-    # === 🌬️ 散熱族群 ===
-    '3017': '🌬️ 散熱', '3324': '🌬️ 散熱', '3338': '🌬️ 散熱', '2421': '🌬️ 散熱', 
-    '3013': '🌬️ 散熱', '8996': '🌬️ 散熱', '6275': '🌬️ 散熱', '6230': '🌬️ 散熱',
-    
-    # === 📦 CoWoS / 先進封裝 / 設備 ===
-    '3131': '📦 CoWoS設備', '3583': '📦 CoWoS設備', '6187': '📦 CoWoS設備', '6640': '📦 CoWoS設備',
-    '3711': '📦 封測代工', '2449': '📦 封測代工', '6239': '📦 封測代工', '8150': '📦 封測代工',
-    '6515': '📦 封測材料', '5443': '📦 封測材料',
-    
-    # === 🔦 CPO / 矽光子 / 網通 ===
-    '2345': '🔦 CPO/網通', '4979': '🔦 CPO/網通', '3450': '🔦 CPO/矽光子', '3363': '🔦 CPO/矽光子',
-    '4908': '🔦 CPO/矽光子', '3081': '🔦 CPO/矽光子', '3234': '🔦 CPO/網通', '6442': '🔦 CPO/網通',
-    '5388': '🔦 CPO/網通', '3704': '🔦 CPO/網通',
-    
-    # === 🧠 矽智財 (IP) / ASIC ===
-    '3661': '🧠 矽智財IP', '3443': '🧠 矽智財IP', '3035': '🧠 矽智財IP', '6531': '🧠 矽智財IP',
-    '3529': '🧠 矽智財IP', '6643': '🧠 矽智財IP', '5269': '🧠 高速傳輸', '4966': '🧠 高速傳輸',
-    
-    # === 🤖 AI 伺服器 / 組裝 (ODM) ===
-    '2382': '🤖 AI伺服器', '3231': '🤖 AI伺服器', '2356': '🤖 AI伺服器', '6669': '🤖 AI伺服器',
-    '2376': '🤖 AI伺服器', '2317': '🤖 鴻海家族', '2354': '🤖 鴻海家族', '2301': '🤖 AI伺服器',
-    
-    # === 💾 記憶體 ===
-    '8299': '💾 記憶體', '2408': '💾 記憶體', '2344': '💾 記憶體', '3260': '💾 記憶體', 
-    '2337': '💾 記憶體', '2451': '💾 記憶體', '4967': '💾 記憶體',
-    
-    # === 💎 晶圓代工 ===
-    '2330': '💎 晶圓代工', '2303': '💎 晶圓代工', '5347': '💎 晶圓代工', '3707': '💎 晶圓代工',
-    
-    # === 🧱 PCB / CCL (銅箔基板) ===
-    '2383': '🧱 PCB/CCL', '6213': '🧱 PCB/CCL', '6274': '🧱 PCB/CCL', '2368': '🧱 PCB/CCL',
-    '3037': '🧱 PCB/CCL', '2313': '🧱 PCB/CCL', '3044': '🧱 PCB/CCL',
-    
-    # === ⚡ 重電 / 綠能 / 電線電纜 ===
-    '1513': '⚡ 重電綠能', '1519': '⚡ 重電綠能', '1503': '⚡ 重電綠能', '1504': '⚡ 重電綠能',
-    '1609': '⚡ 電線電纜', '1605': '⚡ 電線電纜', '9958': '⚡ 綠能風電',
-    
-    # === 🚢 航運 ===
-    '2603': '🚢 貨櫃航運', '2609': '🚢 貨櫃航運', '2615': '🚢 貨櫃航運', 
-    '2618': '✈️ 航空', '2610': '✈️ 航空', '2637': '🚢 散裝航運',
-    
-    # === 💰 金融 ===
-    '2881': '💰 金融壽險', '2882': '💰 金融壽險', '2886': '💰 金融', '2891': '💰 金融',
-    '2884': '💰 金融', '2885': '💰 金融', '2883': '💰 金融', '2892': '💰 金融',
-    
-    # === 🧱 傳產 (水泥/鋼鐵/塑膠) ===
-    '2002': '🏗️ 鋼鐵', '1101': '🏗️ 水泥', '1301': '🛢️ 塑膠', '1303': '🛢️ 塑膠', '2105': '🚗 輪胎'
-}
-
-def get_detailed_industry(row):
-    code = str(row['股票代號']).strip()
-    name = str(row['股票名稱']).strip()
-    
-    if code in STOCK_SECTOR_MAP:
-        return STOCK_SECTOR_MAP[code]
-    
-    if '金' in name and '銀' in name: return '💰 金融'
-    if '電' in name: return '🔌 其他電子'
-    
-    return '📦 其他'
+def load_lifecycle(etf_code, date_str):
+    # 最新一天直接用存檔時推好的狀態；看舊日期才從共識矩陣推到那天 (同一天只推一次)
+    ensure_lifecycle(fund_codes())
+    lc = get_frame_cache().get(LIFECYCLE_PATH, PositionLifecycle.load)
+    if lc.fund_as_of(etf_code) == date_str: return lc
+    ensure_matrix(fund_codes())
+    return get_frame_cache().get(MATRIX_PATH, lambda: PositionLifecycle.from_matrix(HoldingsMatrix.load(), until=date_str),
+                                 tag=("lifecycle", date_str))
 
-# --- 判斷狀態標籤 ---
-def determine_status(row):
-    if row['持有股數_old'] == 0 and row['持有股數'] > 0:
-        return "🔥 新進"
-    elif row['持有股數_old'] > 0 and row['持有股數'] == 0:
-        return "👋 剔除"
-    elif row['股數變化_日'] > 0:
-        return "📈 加碼"
-    elif row['股數變化_日'] < 0:
-        return "📉 減碼"
-    else:
-        return "➖ 持平"
+# --- 狀態標籤 (異動表的 狀態 欄 → 本頁用語) ---
+STATUS_LABELS = {
+    STATUS_NEW: "🔥 新進",
+    STATUS_EXIT: "👋 剔除",
+    STATUS_ADD: "📈 加碼",
+    STATUS_CUT: "📉 減碼",
+    STATUS_FLAT: "➖ 持平",
+}
 
 # --- 色彩樣式 ---
 def highlight_status(val):
@@ -149,60 +79,99 @@ def color_change_text(val):
         return f'color: {color}'
     return ''
 
+def streak_label(n):
+    if n > 0: return f"🔴 連加 {n}"
+    if n < 0: return f"🟢 連減 {-n}"
+    return "➖"
+
+def show_lifecycle(etf_code, date_now_str, data_start):
+    st.subheader("🧬 持倉生命週期")
+    lc = load_lifecycle(etf_code, date_now_str)
+    show_closed = st.checkbox("顯示已出場", value=False, key=f"lc_closed_{etf_code}")
+    life = lc.table(etf_code, include_closed=show_closed)
+    if life.empty:
+        st.info("無資料")
+        return
+
+    holding = life[life['持有中']]
+    l1, l2, l3 = st.columns(3)
+    l1.metric("⏳ 平均持有天數", f"{holding['持有天數'].mean():.0f} 天" if not holding.empty else "—")
+    top_streak = life.sort_values('連續加減碼', ascending=False).iloc[0]
+    l2.metric("🔁 最長連續加碼", f"{top_streak['股票名稱']}" if top_streak['連續加減碼'] > 0 else "無",
+              f"{int(top_streak['連續加減碼'])} 次" if top_streak['連續加減碼'] > 0 else None)
+    # 資料起點當天就持有的是追蹤前的部位，不算新進
+    recent = (holding['進場日'] > pd.Timestamp(date_now_str) - pd.Timedelta(days=20)) & (holding['進場日'] > pd.Timestamp(data_start))
+    l3.metric("🆕 近 20 天新進", f"{int(recent.sum())} 檔")
+
+    life = life.assign(
+        狀態=life['持有中'].map({True: "🟢 持有中", False: "⚪ 已出場"}),
+        連續=life['連續加減碼'].map(streak_label),
+        距高點=(life['持有股數'] / life['最高股數'].where(life['最高股數'] > 0) * 100).fillna(0),
+    ).sort_values(['持有中', '持有天數'], ascending=[False, False])
+    st.caption(f"截至 {date_now_str}；進場日等於資料起點的部位是追蹤前就已持有。連續加減碼從進場後第一次增減算起，不因持平中斷，反向操作才重算。")
+    st.dataframe(
+        life,
+        column_order=['狀態', '股票名稱', '持有股數', '最高股數', '距高點', '進場日', '出場日', '持有天數', '連續'],
+        hide_index=True,
+        use_container_width=True,
+        height=500,
+        column_config={
+            "持有股數": st.column_config.NumberColumn("庫存", format="%d"),
+            "最高股數": st.column_config.NumberColumn("期間最高", format="%d"),
+            "距高點": st.column_config.ProgressColumn("庫存/最高", format="%.0f%%", min_value=0, max_value=100),
+            "進場日": st.column_config.DateColumn("進場日"),
+            "出場日": st.column_config.DateColumn("出場日"),
+            "持有天數": st.column_config.NumberColumn("持有天數", format="%d 天"),
+            "連續": st.column_config.TextColumn("連續加減碼", width="small"),
+        }
+    )
+
 def show_etf_dashboard(etf_code, etf_name):
     st.markdown(f"---")
     st.header(f"📈 {etf_code} {etf_name}")
     
-    csv_path = f'data/{etf_code}_history.csv'
-    raw_df = load_data(csv_path)
-    if raw_df is None or raw_df.empty:
+    snaps = load_data(etf_code)
+    if snaps is None:
         st.warning(f"⚠️ {etf_code} 尚無資料")
         return
 
-    df = clean_data(raw_df)
-    all_dates = df['DateStr'].unique()
-    if len(all_dates) == 0: return
+    all_dates = snaps.date_strs
 
     # --- 控制列 ---
-    c1, c2, c3 = st.columns([1, 1, 2])
+    c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
     with c1:
         date_now_str = st.selectbox(f"基準日期", all_dates, index=0, key=f"d1_{etf_code}")
+    with c2:
+        trend_window = st.selectbox("趨勢天數", TREND_WINDOWS, index=0, key=f"tw_{etf_code}")
     
-    idx_now = list(all_dates).index(date_now_str)
-    idx_prev = idx_now + 1 if idx_now + 1 < len(all_dates) else idx_now
+    idx_now = snaps.position(date_now_str)
+    idx_prev = snaps.back(idx_now, 1)
     date_prev_str = all_dates[idx_prev]
-    idx_week = idx_now + 5 if idx_now + 5 < len(all_dates) else len(all_dates) - 1
-    date_week_str = all_dates[idx_week]
 
+    # 區間：固定幾個交易日，或自訂任一個較早的基準日
     with c3:
-        st.caption(f"📅 比較區間： 日變化 ({date_prev_str}) | 週變化 ({date_week_str})")
+        window = st.selectbox("比較區間", WINDOW_CHOICES + ("自訂",), index=WINDOW_CHOICES.index(DEFAULT_WINDOW),
+                              format_func=lambda w: w if w == "自訂" else f"{w} 個交易日", key=f"win_{etf_code}")
+        if window == "自訂":
+            older = all_dates[idx_now + 1:] or [date_now_str]
+            base_str = st.selectbox("區間基準日", older, index=min(DEFAULT_WINDOW, len(older)) - 1, key=f"wb_{etf_code}")
+            window = snaps.position(base_str) - idx_now
+    idx_base = snaps.back(idx_now, window)
+    date_base_str = all_dates[idx_base]
+    window_label = f"近{idx_base - idx_now}日"
+
+    with c4:
+        st.caption(f"📅 比較區間： 日變化 ({date_prev_str}) | {window_label}變化 ({date_base_str})")
     
     # --- 資料準備 ---
+    # 日 / 區間變化都從 日期 × 股票 矩陣兩列相減 (etfcore/windows.py，每個資料版本只鋪一次)
     try:
-        df_now = df[df['DateStr'] == date_now_str].copy().set_index('股票代號')
-        df_prev = df[df['DateStr'] == date_prev_str].copy().set_index('股票代號')
-        df_week = df[df['DateStr'] == date_week_str].copy().set_index('股票代號')
-        
-        merged = df_now[['股票名稱', '持有股數', '權重']].join(
-            df_prev[['持有股數']], lsuffix='', rsuffix='_old', how='outer'
-        ).fillna(0)
-        
-        merged = merged.join(df_week[['持有股數']], rsuffix='_week', how='outer').fillna(0)
-        
-        merged['股數變化_日'] = merged['持有股數'] - merged['持有股數_old']
-        merged['股數變化_週'] = merged['持有股數'] - merged['持有股數_week']
-        
-        # ★★★ 修正點：使用 Series 進行 map 和 fillna (防止 Index 錯誤) ★★★
-        name_series = pd.concat([df_now['股票名稱'], df_prev['股票名稱']])
-        name_series = name_series[~name_series.index.duplicated(keep='first')]
-        name_map = name_series.to_dict()
-        
-        idx_series = merged.index.to_series()
-        merged['股票名稱'] = idx_series.map(name_map).fillna(idx_series)
-        # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
-
-        merged = merged.reset_index()
-        merged['產業'] = merged.apply(get_detailed_industry, axis=1)
+        df_now = snaps.at(idx_now)
+        merged = window_changes(snaps, idx_now, window)
+        merged['產業'] = merged['股票代號'].map(snaps.memo['industry'])  # 每個資料版本只分類一次
+        # 估計金額 = 股數變化 × 基準日收盤價 (data/prices.csv)；沒有價格時退回用股數
+        merged = add_flows(merged, load_price_matrix(), date_now_str, {'股數變化_日': '金額變化_日', '股數變化_區間': '金額變化_區間'})
+        by_money = has_flows(merged, '金額變化_區間')
 
     except Exception as e:
         st.error(f"資料處理錯誤: {e}")
@@ -210,78 +179,83 @@ def show_etf_dashboard(etf_code, etf_name):
 
     # --- KPI 區塊 ---
     industry_counts = merged[merged['持有股數']>0]['產業'].value_counts()
+    industry_counts = industry_counts[industry_counts > 0]  # Categorical 會列出沒持有的題材
     top_industry = industry_counts.index[0] if not industry_counts.empty else "無"
     
     k1, k2, k3, k4 = st.columns(4)
     k1.metric("📊 總持股數", f"{len(df_now)} 檔")
     
-    top_buy_week = merged.sort_values('股數變化_週', ascending=False).iloc[0]
-    if top_buy_week['股數變化_週'] > 0:
-        k2.metric("🏆 本週加碼王", f"{top_buy_week['股票名稱']}", f"+{int(top_buy_week['股數變化_週']):,} 股")
+    top_buy = merged.sort_values('金額變化_區間' if by_money else '股數變化_區間', ascending=False).iloc[0]
+    if by_money and top_buy['金額變化_區間'] > 0:
+        k2.metric(f"🏆 {window_label}加碼王", f"{top_buy['股票名稱']}", f"{format_twd(top_buy['金額變化_區間'])} ({int(top_buy['股數變化_區間']):+,} 股)")
+    elif not by_money and top_buy['股數變化_區間'] > 0:
+        k2.metric(f"🏆 {window_label}加碼王", f"{top_buy['股票名稱']}", f"+{int(top_buy['股數變化_區間']):,} 股")
     else:
-        k2.metric("🏆 本週加碼王", "無", "0")
+        k2.metric(f"🏆 {window_label}加碼王", "無", "0")
         
     k3.metric("🏭 最大持倉題材", top_industry, f"{industry_counts.get(top_industry, 0)} 檔")
     
     day_act = merged[merged['股數變化_日'] != 0]
     k4.metric("⚡ 今日異動檔數", f"{len(day_act)} 檔")
 
-    # --- 圖表區 (產業圓餅圖 + 週變化) ---
+    # --- 圖表區 (產業圓餅圖 + 區間變化) ---
     col_chart1, col_chart2 = st.columns(2)
     
     with col_chart1:
         st.subheader("🏭 持股題材分佈")
         if not industry_counts.empty:
-            fig1 = px.pie(
-                values=industry_counts.values, 
-                names=industry_counts.index,
-                hole=0.4,
-                color_discrete_sequence=px.colors.sequential.Turbo
-            )
-            fig1.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0))
-            st.plotly_chart(fig1, use_container_width=True)
+            with span("chart_build", chart="pie"):
+                fig1 = px.pie(
+                    values=industry_counts.values, 
+                    names=industry_counts.index,
+                    hole=0.4,
+                    color_discrete_sequence=px.colors.sequential.Turbo
+                )
+                fig1.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0))
+                st.plotly_chart(fig1, use_container_width=True)
         else:
             st.info("無資料")
 
     with col_chart2:
-        st.subheader("📅 近一週大戶動作 (前10名)")
-        week_movers = merged[merged['股數變化_週'].abs() > 0].sort_values('股數變化_週', ascending=False).head(10)
+        st.subheader(f"📅 {window_label}大戶動作 (前10名)")
+        movers = merged[merged['股數變化_區間'].abs() > 0].sort_values('股數變化_區間', ascending=False).head(10)
         
-        if not week_movers.empty:
-            fig2 = go.Figure()
-            fig2.add_trace(go.Bar(
-                y=week_movers['股票名稱'], x=week_movers['股數變化_週'],
-                orientation='h',
-                marker=dict(color=week_movers['股數變化_週'], colorscale='RdBu', cmid=0),
-                text=week_movers['股數變化_週'].apply(lambda x: f"{x:+,.0f}"),
-                textposition='outside'
-            ))
-            fig2.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), xaxis_title="近5日股數增減")
-            st.plotly_chart(fig2, use_container_width=True)
+        if not movers.empty:
+            with span("chart_build", chart="bar"):
+                fig2 = go.Figure()
+                fig2.add_trace(go.Bar(
+                    y=movers['股票名稱'], x=movers['股數變化_區間'],
+                    orientation='h',
+                    marker=dict(color=movers['股數變化_區間'], colorscale='RdBu', cmid=0),
+                    text=movers['股數變化_區間'].apply(lambda x: f"{x:+,.0f}"),
+                    textposition='outside'
+                ))
+                fig2.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), xaxis_title=f"{window_label}股數增減")
+                st.plotly_chart(fig2, use_container_width=True)
         else:
-            st.info("累積數據不足，暫無週變化資料")
+            st.info(f"累積數據不足，暫無{window_label}變化資料")
 
     # --- 戰略表格 ---
     st.subheader("📋 戰略持股監控 (題材細分版)")
     
     table_df = merged[(merged['持有股數'] > 0) | (merged['持有股數_old'] > 0)].copy()
-    table_df['狀態'] = table_df.apply(determine_status, axis=1)
+    table_df['狀態'] = table_df['狀態_日'].map(STATUS_LABELS)
 
-    trend_col = []
-    for code in table_df['股票代號']:
-        trend_col.append(get_trend_data(df, code))
-    table_df['歷史走勢'] = trend_col
+    # 一次 pivot 算出所有股票的走勢 (截至基準日)，同一天重複瀏覽直接拿快取
+    trends = get_trends(snaps, idx_now, trend_window)
+    table_df['歷史走勢'] = trend_column(trends, table_df['股票代號'])
 
-    table_df['sort_score'] = table_df['股數變化_週'].abs()
+    table_df['sort_score'] = table_df['金額變化_區間' if by_money else '股數變化_區間'].abs()
+    table_df['金額變化_區間'] = table_df['金額變化_區間'] / 1e4  # 萬元
     table_df = table_df.sort_values(['sort_score'], ascending=[False])
 
     styled_df = table_df.style\
         .map(highlight_status, subset=['狀態'])\
-        .map(color_change_text, subset=['股數變化_日', '股數變化_週'])
+        .map(color_change_text, subset=['股數變化_日', '股數變化_區間'])
 
     st.dataframe(
         styled_df,
-        column_order=['狀態', '產業', '股票名稱', '權重', '股數變化_日', '股數變化_週', '持有股數', '歷史走勢'],
+        column_order=['狀態', '產業', '股票名稱', '權重', '股數變化_日', '股數變化_區間'] + (['金額變化_區間'] if by_money else []) + ['持有股數', '歷史走勢'],
         hide_index=True,
         use_container_width=True,
         height=1000, 
@@ -291,12 +265,16 @@ def show_etf_dashboard(etf_code, etf_name):
             "股票名稱": st.column_config.TextColumn("股票名稱"),
             "權重": st.column_config.ProgressColumn("權重", format="%.2f%%", min_value=0, max_value=10),
             "股數變化_日": st.column_config.NumberColumn("日增減", format="%+d"),
-            "股數變化_週": st.column_config.NumberColumn("週增減", format="%+d"),
+            "股數變化_區間": st.column_config.NumberColumn(f"{window_label}增減", format="%+d"),
+            "金額變化_區間": st.column_config.NumberColumn(f"{window_label}金額 (萬)", format="%+,.0f"),
             "持有股數": st.column_config.NumberColumn("庫存", format="%d"),
-            "歷史走勢": st.column_config.LineChartColumn("30日趨勢", width="medium")
+            "歷史走勢": st.column_config.LineChartColumn(f"{trend_window}日趨勢", width="medium")
         }
     )
 
-# 執行顯示
-show_etf_dashboard("00981A", "主動統一台股增長")
-show_etf_dashboard("00991A", "主動復華未來50")
+    show_lifecycle(etf_code, date_now_str, all_dates[-1])
+
+# 執行顯示 (依 etfcore/funds.py 登錄表)；設定 ETF_TRACE 時每次重跑記一筆 trace (etfcore/tracing.py)
+with trace("render", app="etl"):
+    for fund in FUNDS:
+        with span("render_fund", fund=fund["code"]): show_etf_dashboard(fund["code"], fund["short_name"])
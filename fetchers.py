@@ -0,0 +1,264 @@
+import os
+import time
+import threading
+import pandas as pd
+import requests
+import lxml.html
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from etfcore.funds import FUNDS, DEFAULT_MIN_ROWS, get_fund
+
+# ==========================================
+# 免瀏覽器抓取：能直接拿到 HTML / JSON 的基金走 requests，
+# 抓不到或筆數不夠才退回 Selenium。
+# ==========================================
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+HTTP_TIMEOUT = int(os.environ.get("ETF_HTTP_TIMEOUT", "20"))
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+
+# 每檔基金的 HTTP 來源寫在 etfcore/funds.py 的 "http" 欄位；沒有的基金只走 Selenium。
+# 網址可用環境變數 ETF_HTTP_URL_<代號> 覆蓋 (網站改版時不用改程式)；verified=False 的來源只有設定了才會用。
+# 目前的來源都還是 verified=False (網址與格式沒跟真實網站對照過)，沒設定環境變數時每檔都照舊開瀏覽器。
+IDENTITY_XPATH = "//title"  # HTML 預設只在頁面標題找基金識別字
+IDENTITY_FIELDS = ("FundID", "FundCode", "FundNo", "fundCode", "fundNo")  # JSON 預設看這些欄位的值
+HOLDING_COLUMNS = ['股票代號', '股票名稱', '持有股數', '權重']
+
+# --- 連線池：整個行程共用一個 Session (keep-alive + 重試) ---
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def get_session():
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=None)
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"User-Agent": USER_AGENT})
+            _SESSION = session
+    return _SESSION
+
+# --- 共用清洗 ---
+def clean_column_name(col):
+    if isinstance(col, tuple): col = "".join(str(c) for c in col)
+    return str(col).strip().replace(" ", "").replace("\n", "")
+
+def clean_cell_data(val):
+    s = str(val).strip()
+    parts = s.split()
+    if len(parts) == 2 and parts[0] == parts[1]:
+        return parts[0]
+    if len(s) > 1 and len(s) % 2 == 0:
+        mid = len(s) // 2
+        if s[:mid] == s[mid:]:
+            return s[:mid]
+    return s
+
+def holdings_rename_map(columns):
+    rename_map = {}
+    for c in columns:
+        key = c.lower()
+        if "代號" in c or "代碼" in c or "code" in key or "stockno" in key: rename_map[c] = "股票代號"
+        elif "名稱" in c or "name" in key: rename_map[c] = "股票名稱"
+        elif "股數" in c or "share" in key or "qty" in key: rename_map[c] = "持有股數"
+        elif "權重" in c or "比重" in c or "weight" in key: rename_map[c] = "權重"
+    return rename_map
+
+def normalize_holdings(df):
+    """把任意來源的持股表轉成 股票代號/股票名稱/持有股數/權重 四欄；不像持股表就回傳 None"""
+    df = df.copy()
+    df.columns = [clean_column_name(c) for c in df.columns]
+    df = df.rename(columns=holdings_rename_map(df.columns))
+    df = df.loc[:, ~df.columns.duplicated()]
+    if "股票名稱" not in df.columns or "權重" not in df.columns: return None
+    if "股票代號" not in df.columns: df["股票代號"] = df["股票名稱"]
+    if "持有股數" not in df.columns: df["持有股數"] = 0
+    df = df[HOLDING_COLUMNS]
+    for col in df.columns: df[col] = df[col].apply(clean_cell_data)
+    df = df[~df['股票名稱'].str.contains('查看更多|更多|Total|合計', na=False)]
+    df['持有股數'] = df['持有股數'].astype(str).str.replace(',', '').str.replace('--', '0')
+    df['權重'] = df['權重'].astype(str).str.replace('%', '')
+    return df.reset_index(drop=True)
+
+def validate_holdings(fund, df):
+    """回傳 (可存檔的表, 錯誤訊息)；筆數門檻見 etfcore/funds.py 的 min_rows"""
+    if df is None or df.empty: return None, "找不到表格"
+    df = df.drop_duplicates(subset=['股票代號'])
+    min_rows = fund.get("min_rows", DEFAULT_MIN_ROWS)
+    if len(df) < min_rows: return None, f"只抓到 {len(df)} 筆 (門檻 {min_rows})，拒絕存檔！"
+    return df, None
+
+# --- 解析器 ---
+# 表格一律先轉成「表格 → 列 → 儲存格文字」的巢狀 list，再交給下面兩個解析器：
+#   HTTP 抓到的 HTML 用 html_tables (lxml)；Selenium 用 scraper.page_tables (一次 JS 呼叫拿整頁)
+def parse_html(html):
+    try:
+        return lxml.html.fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        return None
+
+def html_tables(html):
+    """lxml 版的 page_tables：每張 <table> 的每一列 (不含巢狀表格的列) 的儲存格文字；
+    html 可以是字串或 parse_html 解析好的節點"""
+    root = parse_html(html) if isinstance(html, (str, bytes)) else html
+    if root is None: return []
+    for br in root.iter("br"): br.tail = "\n" + (br.tail or "")  # 跟 innerText 一樣，<br> 算換行
+    tables = []
+    for table in root.iter("table"):
+        rows = table.xpath("./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr")
+        tables.append([[cell.text_content().strip() for cell in row if cell.tag in ("td", "th")] for row in rows])
+    return tables
+
+def parse_holdings_tables(tables):
+    """有表頭的持股表：找到能對應出「名稱 + 權重」的那一列當表頭，取筆數最多的那張表"""
+    best = None
+    for rows in tables:
+        for i, header in enumerate(rows):
+            names = [clean_column_name(c) for c in header]
+            mapped = set(holdings_rename_map(names).values())
+            if "股票名稱" not in mapped or "權重" not in mapped: continue
+            body = [r for r in rows[i + 1:] if len(r) == len(header)]
+            df = normalize_holdings(pd.DataFrame(body, columns=names)) if body else None
+            if df is not None and (best is None or len(df) > len(best)): best = df
+            break
+    return best
+
+def parse_holdings_rows(rows):
+    """表格不是標準結構時 (表頭不在 table 裡、代號跟名稱擠在同一格)：用 4 碼代號 / % / 千分位猜欄位"""
+    processed_data = []
+    for cells in rows:
+        parts = [p.strip() for c in cells for p in c.replace('\t', '\n').split('\n') if p.strip() != ""]
+        if len(parts) < 3 or not any(char.isdigit() for char in "".join(parts)): continue
+        code = next((p for p in parts if p.isdigit() and len(p) == 4), None)
+        if not code: continue
+        idx = parts.index(code)
+        name = parts[idx + 1] if idx + 1 < len(parts) else "未知"
+        weight = next((p for p in parts if '%' in p), "0")
+        shares = next((p for p in parts if ',' in p and '%' not in p), "0")
+        processed_data.append([code, name, shares, weight])
+    if not processed_data: return None
+    return normalize_holdings(pd.DataFrame(processed_data, columns=HOLDING_COLUMNS))
+
+def parse_holdings_html(html):
+    return parse_holdings_tables(html_tables(html))
+
+def _json_tables(obj):
+    # 找出 JSON 裡所有「像表格」的東西：list[dict]，或 {Columns: [...], Rows: [[...]]}
+    if isinstance(obj, dict):
+        cols, rows = obj.get("Columns") or obj.get("columns"), obj.get("Rows") or obj.get("rows")
+        if isinstance(cols, list) and isinstance(rows, list) and rows and isinstance(rows[0], list):
+            yield pd.DataFrame(rows, columns=[str(c) for c in cols])
+        for v in obj.values(): yield from _json_tables(v)
+    elif isinstance(obj, list):
+        if obj and all(isinstance(x, dict) for x in obj) and not any(isinstance(v, (list, dict)) for v in obj[0].values()):
+            yield pd.DataFrame(obj)
+        else:
+            for v in obj: yield from _json_tables(v)
+
+def parse_holdings_json(data):
+    best = None
+    for df in _json_tables(data):
+        df = normalize_holdings(df)
+        if df is not None and (best is None or len(df) > len(best)): best = df
+    return best
+
+# --- 抓取 ---
+def source_url(etf_code, source, base_url=None):
+    """要抓的網址；來源未確認又沒有環境變數覆蓋時回傳 None"""
+    if base_url: return f"{base_url.rstrip('/')}/{source['fixture']}"
+    override = os.environ.get(f"ETF_HTTP_URL_{etf_code}")
+    if override: return override
+    return source["url"] if source.get("verified", True) else None
+
+def fund_markers(fund):
+    """回應裡認得出是這檔基金的字串：代號、名稱、來源設定的 identity"""
+    return [fund["code"], fund["name"]] + list(fund["http"].get("identity", []))
+
+def _json_values(obj, keys):
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k in keys and isinstance(v, (str, int)): yield str(v)
+            yield from _json_values(v, keys)
+    elif isinstance(obj, list):
+        for v in obj: yield from _json_values(v, keys)
+
+def matches_fund(fund, page):
+    """網址猜錯、被轉址或網站回預設基金時，表格筆數照樣夠；要在「指定位置」看到這檔基金的識別字才收。
+    page 是解析好的 HTML (lxml) 或 JSON。不搜整頁：列出所有基金的下拉選單會讓任何回應都過關。
+      HTML → identity_xpath 選到的節點文字 (預設頁面標題)
+      JSON → identity_fields 欄位的值要完全相同 (預設 FundID 等)"""
+    source, markers = fund["http"], [m for m in fund_markers(fund) if m]
+    if source["kind"] == "json":
+        values = set(_json_values(page, set(source.get("identity_fields", IDENTITY_FIELDS))))
+        return any(m in values for m in markers)
+    nodes = page.xpath(source.get("identity_xpath", IDENTITY_XPATH))
+    texts = [n.text_content() if hasattr(n, "text_content") else str(n) for n in nodes]
+    return any(m in t for t in texts for m in markers)
+
+def fetch_holdings(etf_code, base_url=None, timeout=HTTP_TIMEOUT):
+    """HTTP 抓持股表；成功回傳清洗好的 DataFrame，沒有來源/失敗/筆數不足回傳 None (交給 Selenium)"""
+    fund = get_fund(etf_code)
+    source = fund.get("http") if fund else None
+    if source is None: return None
+    url = source_url(etf_code, source, base_url)
+    if url is None: return None
+    start = time.perf_counter()
+    try:
+        session = get_session()
+        if source.get("method", "GET") == "POST":
+            resp = session.post(url, json=source.get("payload"), timeout=timeout)
+        else:
+            resp = session.get(url, timeout=timeout)
+        resp.raise_for_status()
+        resp.encoding = resp.apparent_encoding if resp.encoding in (None, "ISO-8859-1") else resp.encoding
+        page = resp.json() if source["kind"] == "json" else parse_html(resp.text)
+        if page is None or not matches_fund(fund, page):
+            print(f"↩️ [{etf_code}] HTTP 回應不是這檔基金 ({resp.url})，改用瀏覽器")
+            return None
+        df = parse_holdings_json(page) if source["kind"] == "json" else parse_holdings_tables(html_tables(page))
+    except Exception as e:
+        print(f"↩️ [{etf_code}] HTTP 抓取失敗 ({e})，改用瀏覽器")
+        return None
+    elapsed = time.perf_counter() - start
+    if df is None or len(df) < source.get("min_rows", fund.get("min_rows", DEFAULT_MIN_ROWS)):
+        print(f"↩️ [{etf_code}] HTTP 只拿到 {0 if df is None else len(df)} 筆，改用瀏覽器")
+        return None
+    print(f"🌐 [{etf_code}] HTTP 取得 {len(df)} 筆 ({elapsed:.2f}s)")
+    return df
+
+# --- 離線替身伺服器：用 fixtures/ 的合成回應模擬基金網站 ---
+# fixtures/ 不是從真實網站錄下來的：是依 data/*.csv 的持股手寫的 HTML / JSON，頁面結構與 API 欄位是推測的。
+# 只能驗證解析、識別字檢查與退回流程；來源要改成 verified=True 之前，得先拿真實回應對照 (或換成錄製檔)。
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length: self.rfile.read(length)
+        self.do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_fixtures(port=0, directory=FIXTURE_DIR):
+    """在背景啟動本機伺服器，回傳 (server, base_url)；用完記得 server.shutdown()"""
+    handler = partial(FixtureHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    # 離線自我檢查 (合成 fixtures)：python fetchers.py
+    import resource
+    server, base_url = serve_fixtures()
+    try:
+        for code in [f["code"] for f in FUNDS if f.get("http")]:
+            df = fetch_holdings(code, base_url=base_url)
+            print(f"  {code}: {'失敗' if df is None else f'{len(df)} 筆，前三名 ' + '、'.join(df['股票名稱'].head(3))}")
+    finally:
+        server.shutdown()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"📦 最大記憶體 {peak:.0f} MB (不含 Chrome)")
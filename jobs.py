@@ -0,0 +1,177 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+import subprocess
+
+# ==========================================
+# 背景更新：一次只跑一個 update_data.py
+#   - 同一個 Streamlit 行程：後按的人直接加入正在跑的那一次
+#   - 跨行程 (其他 worker、排程)：靠 data/.update.lock 鎖檔互斥
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCK_PATH = os.path.join(BASE_DIR, "data", ".update.lock")
+LOCK_STALE_AFTER = 60 * 60  # 超過一小時的鎖視為殘留
+LOCK_GRACE = 30  # 秒；讀不到內容的鎖檔放超過這麼久才視為殘留
+LOG_LIMIT = 500
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+
+class UpdateLock:
+    def __init__(self, path=LOCK_PATH, stale_after=LOCK_STALE_AFTER):
+        self.path = path
+        self.stale_after = stale_after
+        self.owned = False
+        self._info = None
+
+    def holder(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _stale(self):
+        info = self.holder()
+        if info is None:
+            # 讀不到內容 (壞掉的鎖檔)：放一段時間還是這樣才算殘留；檔案已經不見了就不用清
+            try: return time.time() - os.path.getmtime(self.path) > LOCK_GRACE
+            except OSError: return False
+        return not _pid_alive(info.get("pid", -1)) or time.time() - info.get("time", 0) > self.stale_after
+
+    @staticmethod
+    def _create(path, info):
+        """先把內容寫進暫存檔再 link 到 path：檔案一出現就是完整的 (不會被當成空的殘留鎖)；
+        path 已存在時丟 FileExistsError"""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(info, f)
+        try: os.link(tmp, path)
+        finally: os.remove(tmp)
+
+    def _break_stale(self):
+        """清掉殘留的鎖。同時只讓一個人清 (.break 鎖)，拿到後再確認一次還是殘留才刪，
+        不會把別人剛建立的新鎖刪掉"""
+        breaker = self.path + ".break"
+        try:
+            self._create(breaker, {"pid": os.getpid(), "time": time.time()})
+        except FileExistsError:
+            # 清到一半掛掉的人留下的 .break
+            try:
+                if time.time() - os.path.getmtime(breaker) > LOCK_GRACE: os.remove(breaker)
+            except OSError: pass
+            return
+        try:
+            if self._stale(): os.remove(self.path)
+        except OSError: pass
+        finally:
+            try: os.remove(breaker)
+            except OSError: pass
+
+    def acquire(self):
+        for _ in range(2):
+            info = {"pid": os.getpid(), "time": time.time()}
+            try:
+                self._create(self.path, info)
+            except FileExistsError:
+                if not self._stale(): return False
+                self._break_stale()
+                continue
+            self.owned, self._info = True, info
+            return True
+        return False
+
+    def wait(self, timeout=LOCK_STALE_AFTER, poll=2.0):
+        """等別人的更新跑完 (鎖檔消失或變成殘留)"""
+        deadline = time.time() + timeout
+        while os.path.exists(self.path) and not self._stale() and time.time() < deadline:
+            time.sleep(poll)
+
+    def release(self):
+        if self.owned:
+            # 被判定殘留、已經換人拿的鎖不要刪
+            if self.holder() == self._info:
+                try: os.remove(self.path)
+                except OSError: pass
+            self.owned = False
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+# --- 單次背景更新 ---
+FUND_LINE = re.compile(r"^(\S+)\s*\[(\w+)\]\s*(.*)$")
+
+class UpdateJob:
+    def __init__(self, job_id, cmd, cwd, env=None):
+        self.id = job_id
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env or {}
+        self.lines = []
+        self.funds = {}  # 代號 -> 最新一行狀態
+        self.returncode = None
+        self.started = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    @property
+    def running(self):
+        return not self.done.is_set()
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def _run(self):
+        try:
+            proc = subprocess.Popen(self.cmd, cwd=self.cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    text=True, bufsize=1, env={**os.environ, **self.env, "PYTHONUNBUFFERED": "1"})
+            for line in proc.stdout:
+                self._feed(line.rstrip())
+            self.returncode = proc.wait()
+        except Exception as e:
+            self._feed(f"❌ 執行錯誤: {e}")
+            self.returncode = -1
+        finally:
+            self.finished = time.time()
+            self.done.set()
+
+    def _feed(self, line):
+        if not line: return
+        self.lines.append(line)
+        if len(self.lines) > LOG_LIMIT: del self.lines[:-LOG_LIMIT]
+        m = FUND_LINE.match(line)
+        if m: self.funds[m.group(2)] = f"{m.group(1)} {m.group(3)}"
+
+class UpdateManager:
+    """Streamlit 用 st.cache_resource 持有一個；所有 session 共用"""
+    def __init__(self, cmd=None, cwd=BASE_DIR):
+        self.cmd = cmd or [sys.executable, "update_data.py", "--wait"]
+        self.cwd = cwd
+        self._lock = threading.Lock()
+        self._job = None
+        self._seq = 0
+
+    def current(self):
+        return self._job
+
+    def start(self, env=None):
+        """沒有在跑就開新的一次 (env 是這次額外的環境變數)；已經在跑就回傳那一次 (加入)"""
+        with self._lock:
+            if self._job is not None and self._job.running: return self._job
+            self._seq += 1
+            job = UpdateJob(self._seq, self.cmd, self.cwd, env)
+            self._job = job
+        threading.Thread(target=job._run, daemon=True).start()
+        return job
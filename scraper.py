@@ -0,0 +1,302 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+from webdriver_manager.chrome import ChromeDriverManager
+from fetchers import html_tables, parse_holdings_rows, parse_holdings_tables, validate_holdings
+from etfcore.tracing import span
+
+# ==========================================
+# Selenium 爬蟲：瀏覽器池、等待層、各網站的頁面操作與表格擷取
+# 只有真的要開瀏覽器時才 import (update_data.run_all)，其他程式不用付 selenium 的載入成本
+# ==========================================
+_DRIVER_PATH = None
+_DRIVER_PATH_LOCK = threading.Lock()
+
+def get_driver_path():
+    # ChromeDriverManager().install() 每次都會查版本，整個行程只做一次
+    global _DRIVER_PATH
+    with _DRIVER_PATH_LOCK:
+        if _DRIVER_PATH is None:
+            _DRIVER_PATH = ChromeDriverManager().install()
+    return _DRIVER_PATH
+
+def get_driver():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36")
+    with span("driver_start"):
+        service = Service(get_driver_path())
+        return webdriver.Chrome(service=service, options=chrome_options)
+
+# --- 瀏覽器池：重複使用 WebDriver，最多同時開 size 個 ---
+def driver_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+class DriverPool:
+    def __init__(self, size=1):
+        self.size = max(1, int(size))
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._drivers = set()
+
+    def acquire(self, timeout=None):
+        """借一個瀏覽器；timeout 秒內等不到空位就丟 TimeoutError (None = 一直等)"""
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"等了 {timeout:.0f} 秒還借不到瀏覽器")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            driver = get_driver()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock: self._drivers.add(driver)
+        return driver
+
+    def release(self, driver):
+        # 被 timeout 砍掉或已經壞掉的 session 直接丟棄，下次再開新的
+        if driver_alive(driver): self._idle.put(driver)
+        else: self._discard(driver)
+        self._slots.release()
+
+    def _discard(self, driver):
+        with self._lock: self._drivers.discard(driver)
+        try: driver.quit()
+        except Exception: pass
+
+    @contextmanager
+    def driver(self, timeout=None):
+        driver = self.acquire(timeout)
+        try: yield driver
+        finally: self.release(driver)
+
+    def close(self):
+        with self._lock: drivers, self._drivers = list(self._drivers), set()
+        for driver in drivers:
+            try: driver.quit()
+            except Exception: pass
+
+# --- 等待層：依網站的就緒訊號前進，不再固定 sleep ---
+WAIT_TIMEOUT = int(os.environ.get("ETF_WAIT_TIMEOUT", "25"))
+WAIT_POLL = 0.25
+ROWS_SETTLE = 1.0  # 列數連續多久沒變才算載完
+
+class RunTimer:
+    """記錄單次爬蟲花在等待網頁與解析表格的秒數"""
+    def __init__(self, etf_code):
+        self.etf_code = etf_code
+        self.start = time.perf_counter()
+        self.totals = {"wait": 0.0, "parse": 0.0}
+
+    @contextmanager
+    def track(self, kind):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.totals[kind] += time.perf_counter() - t0
+
+    def report(self):
+        total = time.perf_counter() - self.start
+        print(f"⏱️ [{self.etf_code}] 等待 {self.totals['wait']:.1f}s / 解析 {self.totals['parse']:.1f}s / 總計 {total:.1f}s")
+
+def count_rows(driver, css="table tr"):
+    return driver.execute_script("return document.querySelectorAll(arguments[0]).length;", css)
+
+def table_signature(driver):
+    # 所有表格的列數 + 文字長度；換基金、展開更多都會讓它改變
+    return driver.execute_script(
+        "return Array.from(document.querySelectorAll('table'))"
+        ".map(t => t.rows.length + ':' + t.innerText.length).join('|');"
+    )
+
+def wait_for_element(driver, xpath, timeout=WAIT_TIMEOUT):
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL).until(
+            EC.presence_of_element_located((By.XPATH, xpath))
+        )
+        return True
+    except TimeoutException:
+        return False
+
+def wait_for_stable_rows(driver, css="table tr", min_rows=1, settle=ROWS_SETTLE, timeout=WAIT_TIMEOUT):
+    """等到列數至少 min_rows 且連續 settle 秒沒有變動，回傳最後的列數"""
+    deadline = time.monotonic() + timeout
+    last, since = -1, time.monotonic()
+    while True:
+        n = count_rows(driver, css)
+        now = time.monotonic()
+        if n != last:
+            last, since = n, now
+        elif n >= min_rows and now - since >= settle:
+            return n
+        if now >= deadline: return n
+        time.sleep(WAIT_POLL)
+
+def element_gone(element):
+    try: return not element.is_displayed()
+    except StaleElementReferenceException: return True
+
+def wait_for_table_change(driver, before, element=None, timeout=WAIT_TIMEOUT):
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL).until(
+            lambda d: table_signature(d) != before or (element is not None and element_gone(element))
+        )
+        return True
+    except TimeoutException:
+        return False
+
+def click_and_wait(driver, element, timeout=WAIT_TIMEOUT):
+    """點擊 (分頁/查看更多/展開) 後，等到表格內容改變或按鈕消失才算生效"""
+    before = table_signature(driver)
+    driver.execute_script("arguments[0].click();", element)
+    return wait_for_table_change(driver, before, element, timeout)
+
+# ==========================================
+# 頁面操作步驟 (etfcore/funds.py 的 browser.prepare)
+# 每一步只負責把持股表弄到畫面上；擷取與存檔由 scrape_fund 統一處理。
+# ==========================================
+def prepare_select_option(driver, fund, timer):
+    """下拉選單選到名稱含所有 option_keywords 的基金 (統一投信 PCF 頁)"""
+    keywords = fund["browser"]["option_keywords"]
+    with timer.track("wait"):
+        wait_for_element(driver, "//select")
+    try:
+        for el in driver.find_elements(By.TAG_NAME, "select"):
+            try:
+                select = Select(el)
+                for opt in select.options:
+                    if all(k in opt.text for k in keywords):
+                        with timer.track("wait"):
+                            before = table_signature(driver)
+                            select.select_by_visible_text(opt.text)
+                            wait_for_table_change(driver, before)
+                        return
+            except: pass
+    except: pass
+    finally:
+        with timer.track("wait"):
+            wait_for_stable_rows(driver)
+
+def prepare_click_tabs(driver, fund, timer):
+    """點開持股分頁，再按「查看更多」展開全部 (野村投信)"""
+    tab_xpath = fund["browser"]["tab_xpath"]
+    with timer.track("wait"):
+        wait_for_element(driver, f"{tab_xpath} | //table")
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
+        try:
+            for tab in driver.find_elements(By.XPATH, tab_xpath):
+                if tab.is_displayed():
+                    click_and_wait(driver, tab)
+                    break
+        except: pass
+        wait_for_stable_rows(driver)
+        try:
+            for el in driver.find_elements(By.XPATH, fund["browser"]["more_xpath"]):
+                if el.is_displayed():
+                    click_and_wait(driver, el)
+        except: pass
+        # 展開後的列數停止增加才算載完
+        wait_for_stable_rows(driver)
+
+def prepare_scroll_expand(driver, fund, timer):
+    """捲動觸發 lazy-load，再按「展開更多」(復華投信)"""
+    print(f"💤 [{fund['code']}] 等待網頁載入...")
+    ready_xpath = fund["browser"]["ready_xpath"]
+    with timer.track("wait"):
+        if not wait_for_element(driver, ready_xpath):
+            # 表頭在下方才會 lazy-load，捲到底再等一次
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            wait_for_element(driver, ready_xpath, timeout=5)
+
+        driver.execute_script("window.scrollTo(0, 800);")
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        wait_for_stable_rows(driver)
+
+        try:
+            expand_btn = driver.find_elements(By.XPATH, fund["browser"]["expand_xpath"])
+            if expand_btn:
+                click_and_wait(driver, expand_btn[0])
+        except: pass
+        wait_for_stable_rows(driver, min_rows=5)
+
+PREPARE_STEPS = {
+    "select_option": prepare_select_option,
+    "click_tabs": prepare_click_tabs,
+    "scroll_expand": prepare_scroll_expand,
+}
+
+# ==========================================
+# 持股表擷取 (etfcore/funds.py 的 extractor)，都回傳 normalize_holdings 後的四欄表或 None
+# 整頁表格用一次 JS 呼叫拿回來 (不逐列 round trip)，解析交給 fetchers 裡跟 HTTP 共用的函式
+# ==========================================
+PAGE_TABLES_JS = (
+    "return Array.from(document.querySelectorAll('table')).map(t =>"
+    " Array.from(t.rows).map(r => Array.from(r.cells).map(c => c.innerText.trim())));"
+)
+
+def page_tables(driver):
+    """每張表 → 每列 → 儲存格文字 (格式同 fetchers.html_tables)；JS 失敗就退回 page_source + lxml"""
+    try:
+        tables = driver.execute_script(PAGE_TABLES_JS)
+        if tables is not None: return tables
+    except Exception:
+        pass
+    return html_tables(driver.page_source)
+
+def extract_table(driver, fund):
+    """有表頭的標準表格，取最像持股表的那張"""
+    return parse_holdings_tables(page_tables(driver))
+
+def extract_row_text(driver, fund):
+    """表頭不在表格裡、代號跟名稱擠在同一格：逐列猜欄位"""
+    return parse_holdings_rows([row for table in page_tables(driver) for row in table])
+
+EXTRACTORS = {
+    "table": extract_table,
+    "row_text": extract_row_text,
+}
+
+# ==========================================
+# 通用爬蟲：開頁 → 頁面操作 → 擷取 → 驗證 (存檔交給呼叫端)
+# ==========================================
+def scrape_fund(fund, driver=None):
+    """回傳通過驗證的持股表；失敗回傳 None"""
+    etf_code = fund["code"]
+    print(f"\n🚀 [{etf_code}] 啟動爬蟲：{fund['label']}投信 ({fund['name']})...")
+    own_driver = driver is None
+    if own_driver: driver = get_driver()
+    timer = RunTimer(etf_code)
+    df = None
+    try:
+        # 追蹤 (etfcore.tracing) 的載入頁面包含切換選單 / 分頁等頁面操作，等到表格就緒為止
+        with span("page_load"):
+            driver.get(fund["url"])
+            PREPARE_STEPS[fund["browser"]["prepare"]](driver, fund, timer)
+        with timer.track("parse"), span("extraction", extractor=fund["extractor"]):
+            df, error = validate_holdings(fund, EXTRACTORS[fund["extractor"]](driver, fund))
+        if error: print(f"⛔ [{etf_code}] {error}")
+    except Exception as e: print(f"❌ [{etf_code}] 錯誤: {e}")
+    finally:
+        timer.report()
+        if own_driver: driver.quit()
+    return df